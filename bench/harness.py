@@ -0,0 +1,315 @@
+# bench/harness.py
+"""End-to-end load test of /add_keys, /trial, the OAuth callback and /status.
+
+Runs fully offline: an in-memory store (or a temp SQLite file), fake
+discord.Interaction objects and the local Discord/webhook stub. Each phase
+reports throughput, p50/p95/p99 latency and backend DB ops; the run ends
+with a DM-delivery and double-issue check and exits non-zero if either fails.
+
+usage: python bench/harness.py [--users 200] [--concurrency 50] [--keys 1000]
+                               [--latency-ms 20] [--backend memory|sqlite]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from collections import Counter
+from types import SimpleNamespace
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from bench import stub_discord
+
+PORT       = stub_discord.free_port()
+STAFF_ROLE = 4242
+os.environ.update({
+    "CLIENT_ID": "bench", "CLIENT_SECRET": "bench", "BOT_TOKEN": "bench",
+    "REDIRECT_URI": "http://localhost/cb", "GUILD_IDS": "1",
+    "STAFF_ROLE_IDS": str(STAFF_ROLE),
+    "DISCORD_API_BASE": f"http://127.0.0.1:{PORT}",
+    "LOG_WEBHOOK_URL": f"http://127.0.0.1:{PORT}/webhook",
+    "STORAGE_BACKEND": "memory",
+})
+
+
+# ── Op-counting store ──
+from storage import Store
+
+
+def _prefix(key: str) -> str:
+    head, sep, _ = key.partition(":")
+    return head + sep
+
+
+class CountingStore(Store):
+    """Wraps a backend Store and counts calls by operation and key prefix."""
+
+    def __init__(self, backend: Store):
+        self.backend = backend
+        self.ops     = Counter()  # (op, prefix) -> calls
+
+    def _count(self, op: str, *keys):
+        for prefix in {_prefix(k) for k in keys}:
+            self.ops[op, prefix] += 1
+
+    def get(self, key, default=None):
+        self._count("get", key)
+        return self.backend.get(key, default)
+
+    def set(self, key, value):
+        self._count("set", key)
+        self.backend.set(key, value)
+
+    def delete(self, key):
+        self._count("delete", key)
+        return self.backend.delete(key)
+
+    def scan(self, prefix=""):
+        self._count("scan", prefix)
+        return self.backend.scan(prefix)
+
+    def items(self, prefix=""):
+        self._count("items", prefix)
+        return self.backend.items(prefix)
+
+    def pop(self, key, default=None):
+        self._count("pop", key)
+        return self.backend.pop(key, default)
+
+    def incr(self, key, delta=1):
+        self._count("incr", key)
+        return self.backend.incr(key, delta)
+
+    def set_many(self, items):
+        self._count("set_many", *items)
+        self.backend.set_many(items)
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        self._count("delete_many", *keys)
+        self.backend.delete_many(keys)
+
+
+def install_store(backend: str) -> CountingStore:
+    """Swap `storage.db` for a counted store before any repo module binds it."""
+    import storage
+    from cache import CachedStore
+    if backend == "sqlite":
+        inner = storage.SQLiteStore(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    else:
+        inner = storage.MemoryStore()
+    counted = CountingStore(inner)
+    storage.db = CachedStore(counted) if storage.STORE_CACHE else counted
+    return counted
+
+
+# ── Fake Discord objects ──
+# Every outbound call sleeps for the stub latency, like a REST round-trip.
+class FakeMessage:
+    def __init__(self, interaction, content):
+        self.interaction = interaction
+        self.content     = content
+
+    async def edit(self, content=None, **kwargs):
+        await asyncio.sleep(self.interaction.latency)
+        self.content = content
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self._done       = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, **kwargs):
+        await asyncio.sleep(self.interaction.latency)
+        self._done = True
+
+    async def send_message(self, content=None, **kwargs):
+        await asyncio.sleep(self.interaction.latency)
+        self._done = True
+        self.interaction.sent.append((content, kwargs))
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, *, wait=False, **kwargs):
+        await asyncio.sleep(self.interaction.latency)
+        self.interaction.sent.append((content, kwargs))
+        return FakeMessage(self.interaction, content)
+
+
+class FakeUser:
+    def __init__(self, uid: int, latency: float, staff: bool = False):
+        self.id      = uid
+        self.mention = f"<@{uid}>"
+        self.roles   = [SimpleNamespace(id=STAFF_ROLE)] if staff else []
+        self.latency = latency
+
+
+class FakeInteraction:
+    def __init__(self, user: FakeUser, latency: float):
+        self.user     = user
+        self.latency  = latency
+        self.command  = None
+        self.sent     = []  # (content, kwargs) for every response/followup
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+# ── Phases ──
+async def run_phase(name: str, calls, concurrency: int, counted: CountingStore):
+    """Run `calls` (coroutine factories) at most `concurrency` at a time and report."""
+    gate    = asyncio.Semaphore(concurrency)
+    before  = counted.ops.copy()
+    errors  = []
+
+    async def one(call):
+        async with gate:
+            t = time.perf_counter()
+            try:
+                await call()
+            except Exception as e:
+                errors.append(e)
+            return time.perf_counter() - t
+
+    start   = time.perf_counter()
+    samples = await asyncio.gather(*(one(c) for c in calls))
+    wall    = time.perf_counter() - start
+
+    ops   = counted.ops - before
+    by_op = Counter()
+    for (op, _), n in ops.items():
+        by_op[op] += n
+    top = ", ".join(f"{op} {p or '*'}={n}" for (op, p), n in ops.most_common(4))
+    print(f"── {name} ──")
+    print(f"  calls={len(samples)} errors={len(errors)} wall={wall * 1000:.0f}ms "
+          f"throughput={len(samples) / wall:.1f}/s")
+    print(f"  p50={percentile(samples, 50) * 1000:.1f}ms p95={percentile(samples, 95) * 1000:.1f}ms "
+          f"p99={percentile(samples, 99) * 1000:.1f}ms")
+    print(f"  db ops={sum(by_op.values())} ({sum(by_op.values()) / len(samples):.1f}/call) "
+          + " ".join(f"{op}={n}" for op, n in sorted(by_op.items())))
+    print(f"  busiest: {top}")
+    for e in errors[:3]:
+        print(f"  error: {e!r}")
+
+
+async def main(args):
+    counted = install_store(args.backend)
+    from starlette.requests import Request
+    import bot
+    import pool
+    import oauth_server
+    from storage import db
+    from dispense import engine
+    from records import UserRecord
+    from outbox import outbox
+
+    latency = args.latency_ms / 1000
+    runner  = await stub_discord.start(PORT, latency)
+    files   = runner.app["files"]
+    await stub_discord.login(bot.bot, PORT)
+    pool.ensure_index()
+    engine.start()
+    outbox.start(bot.bot)  # key DMs go to the stub through the bot client
+    staff = FakeUser(1, latency, staff=True)
+
+    # 1) /add_keys: batches uploaded as .txt attachments
+    batches = [range(n, min(n + args.batch, args.keys)) for n in range(0, args.keys, args.batch)]
+    for i, batch in enumerate(batches):
+        files[f"keys{i}.txt"] = "\n".join(f"BENCH-{n}" for n in batch)
+    attachments = [
+        SimpleNamespace(filename=name, url=f"http://127.0.0.1:{PORT}/attachments/{name}")
+        for name in files
+    ]
+    await run_phase("/add_keys", [
+        lambda a=a: bot.add_keys.callback(FakeInteraction(staff, latency), file=a)
+        for a in attachments
+    ], args.concurrency, counted)
+
+    # 2) /trial from unlinked users: each gets an OAuth link with a fresh state
+    unlinked = [FakeUser(10_000 + n, latency) for n in range(args.users)]
+    prompts  = [FakeInteraction(u, latency) for u in unlinked]
+    await run_phase("/trial (unlinked)", [
+        lambda i=i: bot.trial.callback(i) for i in prompts
+    ], args.concurrency, counted)
+
+    # 3) OAuth callback for every link handed out in phase 2
+    def state_of(interaction) -> str:
+        view = interaction.sent[-1][1]["view"]
+        return parse_qs(urlparse(view.children[0].url).query)["state"][0]
+
+    def request(n: int, state: str) -> Request:
+        return Request({
+            "type": "http", "method": "GET", "path": "/oauth/callback", "headers": [],
+            "query_string": f"code=c{n}&state={state}".encode(),
+            "client": (f"10.1.{n // 256}.{n % 256}", 5000),
+        })
+
+    states = [state_of(i) for i in prompts]
+    await run_phase("oauth_callback", [
+        lambda n=n, s=s: oauth_server.oauth_callback(request(n, s)) for n, s in enumerate(states)
+    ], args.concurrency, counted)
+
+    # 4) /trial from users who are linked but have no key yet
+    linked = [FakeUser(20_000 + n, latency) for n in range(args.users)]
+    # seeded in the pre-v1 dict format, so /trial exercises the lazy migration
+    db.set_many({f"user:{u.id}": {"discord_id": str(u.id)} for u in linked})
+    await run_phase("/trial (linked)", [
+        lambda u=u: bot.trial.callback(FakeInteraction(u, latency)) for u in linked
+    ], args.concurrency, counted)
+
+    # 5) /status
+    await run_phase("/status", [
+        lambda: bot.status.callback(FakeInteraction(staff, latency)) for _ in range(args.status)
+    ], args.concurrency, counted)
+
+    # ── DM delivery: let the outbox drain ──
+    start = time.perf_counter()
+    while any(True for _ in db.scan("outbox:")) and time.perf_counter() - start < 60:
+        await asyncio.sleep(0.05)
+    undelivered = sum(1 for _ in db.scan("outbox:"))
+    print("── outbox ──")
+    print(f"  drained in {(time.perf_counter() - start) * 1000:.0f}ms undelivered={undelivered}")
+
+    # ── Double-issue check ──
+    issued = [rec.key for rec in map(UserRecord.decode, (raw for _, raw in db.items("user:"))) if rec.key]
+    dupes  = [k for k, n in Counter(issued).items() if n > 1]
+    leaked = [k for k in issued if pool.has_key(k)]
+    lost   = args.keys - len(issued) - pool.pool_size()
+    print("── integrity ──")
+    print(f"  keys={args.keys} issued={len(issued)} remaining={pool.pool_size()} "
+          f"duplicates={len(dupes)} still_in_pool={len(leaked)} unaccounted={lost}")
+
+    await outbox.stop()
+    from log import notifier
+    await notifier.close()
+    from discord_api import close_session
+    await close_session()
+    await bot.bot.http.close()
+    await runner.cleanup()
+    return not (dupes or leaked or lost or undelivered)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200, help="users per /trial phase")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=250, help="keys per /add_keys file")
+    parser.add_argument("--status", type=int, default=20, help="/status calls")
+    parser.add_argument("--latency-ms", type=int, default=20)
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    ok = asyncio.run(main(parser.parse_args()))
+    sys.exit(0 if ok else 1)
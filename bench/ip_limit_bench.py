@@ -0,0 +1,65 @@
+# bench/ip_limit_bench.py
+"""Per-request cost of the OAuth IP limiter as distinct IPs grow to 1M.
+
+Compares the old list-per-IP `record_ip` with SlidingWindowLimiter and
+prints the cost of each 100k-request slice plus how many IPs are tracked.
+
+usage: python bench/ip_limit_bench.py [--ips 1000000] [--cap 100000]
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from ratelimit import SlidingWindowLimiter
+
+RATE_LIMIT  = 5
+RATE_PERIOD = 60
+SLICE       = 100_000
+
+
+def legacy_limiter():
+    """The pre-limiter `record_ip` from oauth_server.py."""
+    ip_requests = {}
+
+    def record_ip(ip: str) -> bool:
+        now = datetime.now(timezone.utc)
+        lst = ip_requests.get(ip, [])
+        lst = [t for t in lst if (now - t).total_seconds() < RATE_PERIOD]
+        lst.append(now)
+        ip_requests[ip] = lst
+        return len(lst) > RATE_LIMIT
+
+    return record_ip, ip_requests
+
+
+def ip(n: int) -> str:
+    return f"{(n >> 24) & 255}.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}"
+
+
+def run(label, hit, tracked, total):
+    print(label)
+    for base in range(0, total, SLICE):
+        start = time.perf_counter()
+        for n in range(base, base + SLICE):
+            hit(ip(n))
+        per = (time.perf_counter() - start) / SLICE * 1e6
+        print(f"  ips {base + SLICE:>9,}  {per:6.2f} µs/request  tracked={len(tracked()):,}")
+
+
+def main(total: int, cap: int):
+    limiter = SlidingWindowLimiter(RATE_LIMIT, RATE_PERIOD, cap)
+    run(f"sliding window (cap {cap:,})", limiter.hit, lambda: limiter, total)
+
+    record_ip, store = legacy_limiter()
+    run("legacy record_ip", record_ip, lambda: store, total)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ips", type=int, default=1_000_000)
+    parser.add_argument("--cap", type=int, default=100_000)
+    args = parser.parse_args()
+    main(args.ips, args.cap)
@@ -0,0 +1,86 @@
+# bench/ledger_bench.py
+"""Ledger append throughput and /history, /whois latency at scale.
+
+Appends --events events (a dispense and a delivery per claim, plus a
+link per user) to a fresh ledger, compacts it, and times --queries
+history and whois lookups before and after compaction, plus after a
+reopen (cold page cache aside, this is what a restart sees).
+
+usage: python bench/ledger_bench.py [--events 1000000] [--users 50000] [--queries 2000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from ledger import Ledger
+
+
+def percentile(samples: list, p: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def timed_queries(lg: Ledger, users: int, claims: int, queries: int, rng: random.Random) -> dict:
+    results = {}
+    for name, fn, arg in (("history", lg.history, lambda: 900_000 + rng.randrange(users)),
+                          ("whois", lg.whois, lambda: f"KEY-{rng.randrange(claims):08d}")):
+        samples, hits = [], 0
+        for _ in range(queries):
+            value = arg()
+            start = time.perf_counter()
+            hits += bool(fn(value))
+            samples.append((time.perf_counter() - start) * 1000)
+        results[name] = (percentile(samples, 0.5), percentile(samples, 0.99), hits / queries)
+    return results
+
+
+def report(label: str, lg: Ledger, results: dict):
+    print(f"{label}: {len(lg._segments)} sealed segments")
+    for name, (p50, p99, hit) in results.items():
+        print(f"  {name:<8} p50 {p50:6.3f} ms   p99 {p99:6.3f} ms   ({hit:.0%} found)")
+
+
+def main(events: int, users: int, queries: int):
+    path = tempfile.mkdtemp(prefix="ledger-bench-")
+    lg   = Ledger(path)
+    rng  = random.Random(7)
+
+    start = time.perf_counter()
+    for n in range(users):
+        lg.append("link", 900_000 + n)
+    claims = (events - users) // 2
+    for n in range(claims):
+        uid, key = 900_000 + rng.randrange(users), f"KEY-{n:08d}"
+        lg.append("dispense", uid, key, token=n + 1)
+        lg.append("delivery", uid, key, status="delivered", attempts=1)
+    took  = time.perf_counter() - start
+    total = users + 2 * claims
+    size  = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    print(f"appended {total} events in {took:.1f}s ({total / took:,.0f}/s), {size / 2**20:.0f} MiB on disk")
+
+    report("before compaction", lg, timed_queries(lg, users, claims, queries, rng))
+    start  = time.perf_counter()
+    merged = lg.compact()
+    print(f"compaction merged {merged} segments in {time.perf_counter() - start:.1f}s")
+    report("after compaction", lg, timed_queries(lg, users, claims, queries, rng))
+
+    lg.close()
+    start = time.perf_counter()
+    lg    = Ledger(path)
+    lg.history(900_000)
+    print(f"reopened in {(time.perf_counter() - start) * 1000:.0f} ms")
+    report("after reopen", lg, timed_queries(lg, users, claims, queries, rng))
+    lg.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.events, args.users, args.queries)
@@ -0,0 +1,129 @@
+# bench/memory_bench.py
+"""RSS of the full (discord.py default) vs lean gateway profile with many guilds.
+
+Each profile runs in its own process: it builds the client the bot would
+build for --guilds guilds, feeds it synthetic GUILD_CREATE payloads and
+the MESSAGE_CREATE traffic its intents would subscribe to, then reports
+resident memory growth and what ended up cached.
+
+usage: python bench/memory_bench.py [--guilds 2000] [--messages 20]
+"""
+import os
+import gc
+import sys
+import json
+import asyncio
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+PAGE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE / 2**20
+
+
+MEMBER = {"roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0}
+
+
+def user(uid: int) -> dict:
+    return {"id": str(uid), "username": f"user{uid}", "discriminator": "0", "avatar": None}
+
+
+def guild_payload(gid: int) -> dict:
+    """A mid-sized guild as sent without the privileged members intent."""
+    return {
+        "id": str(gid), "name": f"guild {gid}", "owner_id": "1", "member_count": 5000,
+        "icon": None, "features": [], "large": True, "unavailable": False,
+        "roles": [
+            {"id": str(gid * 100 + r), "name": f"role{r}", "permissions": "0", "position": r,
+             "color": 0, "hoist": False, "managed": False, "mentionable": False}
+            for r in range(20)
+        ],
+        "channels": [
+            {"id": str(gid * 1000 + c), "type": 0, "name": f"chan{c}", "position": c,
+             "permission_overwrites": [], "nsfw": False, "parent_id": None}
+            for c in range(30)
+        ],
+        "emojis": [
+            {"id": str(gid * 10000 + e), "name": f"emoji{e}", "roles": [], "require_colons": True,
+             "managed": False, "animated": False, "available": True}
+            for e in range(50)
+        ],
+        "members": [dict(MEMBER, user=user(1))],
+        "voice_states": [], "presences": [], "threads": [], "stickers": [],
+        "stage_instances": [], "guild_scheduled_events": [],
+    }
+
+
+def message_payload(gid: int, n: int) -> dict:
+    author = 10_000 + (gid * 31 + n) % 50_000
+    return {
+        "id": str(gid * 100_000 + n), "channel_id": str(gid * 1000 + n % 30), "guild_id": str(gid),
+        "type": 0, "author": user(author), "content": "hello " * 10,
+        "member": MEMBER,
+        "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False,
+        "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [],
+        "embeds": [], "pinned": False,
+    }
+
+
+async def child(profile: str, guilds: int, messages: int) -> dict:
+    import discord
+    from gateway import build_client
+
+    gc.collect()
+    before = rss_mb()
+    client = build_client(guilds, profile)
+    state  = client._connection
+    state.user = discord.ClientUser(state=state, data=user(1))
+
+    for gid in range(1, guilds + 1):
+        state.parse_guild_create(guild_payload(gid))
+    if client.intents.guild_messages:
+        for gid in range(1, guilds + 1):
+            for n in range(messages):
+                state.parse_message_create(message_payload(gid, n))
+    await asyncio.sleep(0)  # let dispatched events run
+
+    gc.collect()
+    return {
+        "profile": profile,
+        "client": type(client).__name__,
+        "rss_mb": round(rss_mb() - before, 1),
+        "guilds": len(client.guilds),
+        "emojis": len(client.emojis),
+        "messages": len(client.cached_messages),
+        "members": sum(len(g.members) for g in client.guilds),
+        "users": len(client.users),
+    }
+
+
+def main(guilds: int, messages: int):
+    print(f"guilds={guilds} messages/guild={messages}")
+    for profile in ("full", "lean"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", profile, "--guilds", str(guilds), "--messages", str(messages)],
+            capture_output=True, text=True, check=True
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(
+            f"{r['profile']:<5} {r['client']:<18} rss +{r['rss_mb']:7.1f} MB  "
+            f"guilds={r['guilds']} emojis={r['emojis']} messages={r['messages']} "
+            f"members={r['members']} users={r['users']}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--guilds", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=20, help="messages per guild (full profile)")
+    parser.add_argument("--child", choices=("full", "lean"))
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(asyncio.run(child(args.child, args.guilds, args.messages))))
+    else:
+        main(args.guilds, args.messages)
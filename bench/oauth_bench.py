@@ -0,0 +1,84 @@
+# bench/oauth_bench.py
+"""Callback latency with N simultaneous logins against a local Discord stub.
+
+usage: python bench/oauth_bench.py [--logins 50] [--latency-ms 50]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from bench import stub_discord
+
+PORT = stub_discord.free_port()
+os.environ.update({
+    "CLIENT_ID": "bench", "CLIENT_SECRET": "bench", "BOT_TOKEN": "bench",
+    "REDIRECT_URI": "http://localhost/cb", "GUILD_IDS": "1",
+    "DISCORD_API_BASE": f"http://127.0.0.1:{PORT}",
+    "LOG_WEBHOOK_URL": f"http://127.0.0.1:{PORT}/webhook",
+    "STORAGE_BACKEND": "sqlite",
+    "SQLITE_PATH": os.path.join(tempfile.mkdtemp(), "bench.db"),
+})
+
+from starlette.requests import Request
+import oauth_server
+import pool
+from states import create_state
+from records import load_user
+from bot import bot
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def fake_request(n: int, state: str) -> Request:
+    return Request({
+        "type": "http", "method": "GET", "path": "/oauth/callback", "headers": [],
+        "query_string": f"code=c{n}&state={state}".encode(),
+        "client": (f"10.0.{n // 256}.{n % 256}", 5000),
+    })
+
+
+async def main(logins: int, latency_ms: int):
+    runner = await stub_discord.start(PORT, latency_ms / 1000)
+    await stub_discord.login(bot, PORT)
+    pool.ensure_index()
+    pool.push_keys([f"BENCH-{n}" for n in range(logins)])
+    states = [create_state(str(n)) for n in range(logins)]
+
+    async def one(n):
+        t = time.perf_counter()
+        await oauth_server.oauth_callback(fake_request(n, states[n]))
+        return time.perf_counter() - t
+
+    start   = time.perf_counter()
+    samples = await asyncio.gather(*(one(n) for n in range(logins)))
+    wall    = time.perf_counter() - start
+
+    issued = [load_user(n).key for n in range(logins)]
+    print(f"logins={logins} stub_latency={latency_ms}ms wall={wall * 1000:.0f}ms")
+    print(f"p50={percentile(samples, 50) * 1000:.1f}ms p99={percentile(samples, 99) * 1000:.1f}ms")
+    print(f"keys issued={sum(1 for k in issued if k)} unique={len(set(filter(None, issued)))}")
+
+    # let fire-and-forget staff logs reach the stub before it goes away
+    from log import notifier
+    stats = notifier.stats()
+    await notifier.close()
+    print(f"staff log queue: {stats}")
+    from discord_api import close_session
+    await close_session()
+    await bot.http.close()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--latency-ms", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.latency_ms))
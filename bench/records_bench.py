@@ -0,0 +1,115 @@
+# bench/records_bench.py
+"""Legacy dict user records vs the compact v1 record schema.
+
+Builds --users linked users (half holding a key) in both formats and
+reports stored bytes, in-memory size, per-record decode time (JSON plus
+timestamps), the /trial cooldown check, and how long the bulk
+migration takes on a fresh SQLite store.
+
+usage: python bench/records_bench.py [--users 100000]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+from storage import db, dumps
+from records import UserRecord, migrate_users
+
+COOLDOWN_DAYS = 30
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def legacy_record(n: int) -> dict:
+    rec = {
+        "discord_id": str(900_000_000_000_000_000 + n),
+        "email": f"user{n}@example.com",
+        "first_linked_at": (BASE + timedelta(seconds=n)).isoformat(),
+    }
+    if n % 2:
+        rec["dispensed_key"] = f"SKY-{n:08d}-TRIAL"
+        rec["last_dispensed_at"] = (BASE + timedelta(seconds=n, minutes=1)).isoformat()
+        rec["claim_token"] = n
+    return rec
+
+
+def deep_size(obj) -> int:
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(deep_size(k) + deep_size(v) for k, v in obj.items())
+    if isinstance(obj, UserRecord):
+        return sys.getsizeof(obj) + sum(deep_size(getattr(obj, f)) for f in obj.__slots__)
+    return sys.getsizeof(obj)
+
+
+def legacy_decode(raw: str) -> dict:
+    """Load a pre-v1 record and parse its timestamps, as callers had to."""
+    rec = json.loads(raw)
+    for field in ("first_linked_at", "last_dispensed_at"):
+        if field in rec:
+            rec[field] = datetime.fromisoformat(rec[field])
+    return rec
+
+
+def compact_decode(raw: str) -> UserRecord:
+    return UserRecord.decode(json.loads(raw))
+
+
+def legacy_check(raw: str) -> bool:
+    """The pre-v1 /trial cooldown check."""
+    rec = json.loads(raw)
+    if "dispensed_key" not in rec:
+        return False
+    elapsed = datetime.now(timezone.utc) - datetime.fromisoformat(rec["last_dispensed_at"])
+    return elapsed < timedelta(days=COOLDOWN_DAYS)
+
+
+def compact_check(raw: str) -> bool:
+    return UserRecord.decode(json.loads(raw)).cooldown_left(COOLDOWN_DAYS) > 0
+
+
+def per_record(fn, rows, repeat: int = 3) -> float:
+    """Best-of-`repeat` µs per row."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for raw in rows:
+            fn(raw)
+        best = min(best, time.perf_counter() - start)
+    return best / len(rows) * 1e6
+
+
+def main(users: int):
+    legacy  = [legacy_record(n) for n in range(users)]
+    compact = [UserRecord.from_legacy(r) for r in legacy]
+    old_rows = [json.dumps(r) for r in legacy]     # what the stores wrote before
+    new_rows = [dumps(r.encode()) for r in compact]
+
+    old_bytes, new_bytes = sum(map(len, old_rows)), sum(map(len, new_rows))
+    old_mem,   new_mem   = sum(map(deep_size, legacy)), sum(map(deep_size, compact))
+    print(f"users={users}")
+    print(f"stored bytes   legacy {old_bytes / users:6.1f}/rec  v1 {new_bytes / users:6.1f}/rec  "
+          f"({1 - new_bytes / old_bytes:.0%} smaller)")
+    print(f"in memory      legacy {old_mem / users:6.1f}/rec  v1 {new_mem / users:6.1f}/rec  "
+          f"({1 - new_mem / old_mem:.0%} smaller)")
+    for label, old_fn, new_fn in (("decode", legacy_decode, compact_decode),
+                                  ("cooldown check", legacy_check, compact_check)):
+        old_us, new_us = per_record(old_fn, old_rows), per_record(new_fn, new_rows)
+        print(f"{label:<14} legacy {old_us:6.2f} µs    v1 {new_us:6.2f} µs    ({old_us / new_us:.1f}x faster)")
+
+    db.set_many({f"user:{r['discord_id']}": r for r in legacy})
+    start = time.perf_counter()
+    converted = migrate_users()
+    print(f"bulk migration {converted} records in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    args = parser.parse_args()
+    main(args.users)
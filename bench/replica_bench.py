@@ -0,0 +1,121 @@
+# bench/replica_bench.py
+"""Several dispense replicas sharing one SQLite store and SQLite coordinator.
+
+Every replica claims a key for every user at once, so each user is
+contended by all replicas. Reports per-replica outcomes and fails if any
+key is issued twice or any user gets more than one key.
+
+Afterwards it forces the queue lease and then a claim lease to lapse,
+and fails if either leaves a key stranded outside the pool.
+
+usage: python bench/replica_bench.py [--replicas 3] [--users 200] [--keys 1000]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+async def replica(users: int) -> dict:
+    from dispense import engine
+    engine.start()
+    claims = await asyncio.gather(*(engine.claim(str(n), 30) for n in range(users)))
+    return {
+        "statuses": Counter(c.status for c in claims),
+        "issued": {c.user.discord_id: c.key for c in claims if c.status == "issued"},
+    }
+
+
+def lapse_check() -> bool:
+    """A holder whose lease lapsed must leave every key where the next holder finds it."""
+    import pool
+    from storage import db
+    from coordination import coord
+    from dispense import DispenseEngine
+    db["user:lapse"] = {"discord_id": "lapse"}
+    engine = DispenseEngine()
+    real   = coord.is_current
+    size   = pool.pool_size()
+    # keys the child replicas still hold reserved sit in their own lists
+    held   = size - len(set(pool.iter_keys()))
+
+    def reachable() -> int:
+        return len(set(pool.iter_keys())) + held
+
+    try:
+        coord.is_current = lambda lease: False
+        stale = pool.reserve(5)
+        queue_ok = stale == [] and pool.pool_size() == size == reachable()
+
+        coord.is_current = lambda lease: lease.name == pool.QUEUE_LEASE and real(lease)
+        withheld = engine._dispense("lapse", 30)
+        claim_ok = withheld.status == "busy" and pool.pool_size() == size == reachable()
+    finally:
+        coord.is_current = real
+    retried = engine._dispense("lapse", 30)
+    retry_ok = retried.status == "issued" and pool.pool_size() == size - 1 == reachable()
+    print(f"  lapsed queue lease: reserved={stale} size={pool.pool_size()} ok={queue_ok}")
+    print(f"  lapsed claim lease: {withheld.status}, then {retried.status} {retried.key} "
+          f"size={pool.pool_size()} reachable={reachable()} ok={claim_ok and retry_ok}")
+    return queue_ok and claim_ok and retry_ok
+
+
+def main(replicas: int, users: int, keys: int):
+    tmp = tempfile.mkdtemp()
+    env = dict(
+        os.environ, STORAGE_BACKEND="sqlite", SQLITE_PATH=os.path.join(tmp, "bench.db"),
+        COORDINATOR="sqlite", COORDINATOR_PATH=os.path.join(tmp, "coord.db"),
+    )
+    env.setdefault("LOG_WEBHOOK_URL", "http://127.0.0.1:9/webhook")  # dispense imports the staff log
+    os.environ.update(env)
+    import pool
+    from storage import db
+    from records import load_user
+    pool.ensure_index()
+    pool.push_keys(f"BENCH-{n}" for n in range(keys))
+    db.set_many({f"user:{n}": {"discord_id": str(n)} for n in range(users)})
+
+    start = time.perf_counter()
+    procs = [
+        subprocess.Popen(
+            [sys.executable, __file__, "--child", "--users", str(users)],
+            env=dict(env, REPLICA_ID=f"r{i}"), stdout=subprocess.PIPE, text=True
+        )
+        for i in range(replicas)
+    ]
+    results = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procs]
+    wall = time.perf_counter() - start
+
+    issued = []
+    print(f"replicas={replicas} users={users} keys={keys} wall={wall * 1000:.0f}ms")
+    for i, r in enumerate(results):
+        issued += r["issued"].items()
+        print(f"  r{i}: {dict(r['statuses'])}")
+    per_user = Counter(uid for uid, _ in issued)
+    per_key  = Counter(key for _, key in issued)
+    records  = [load_user(n, fresh=True).key for n in range(users)]
+    dupes    = sum(1 for n in per_key.values() if n > 1)
+    doubled  = sum(1 for n in per_user.values() if n > 1)
+    print(f"  issued={len(issued)} users_with_key={sum(1 for k in records if k)} "
+          f"duplicate_keys={dupes} users_issued_twice={doubled} remaining={pool.pool_size()}")
+    return not (dupes or doubled) and lapse_check()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replicas", type=int, default=3)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--child", action="store_true")
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(asyncio.run(replica(args.users))))
+    else:
+        sys.exit(0 if main(args.replicas, args.users, args.keys) else 1)
@@ -0,0 +1,60 @@
+# bench/spam_bench.py
+"""Anti-spam check cost: old DB-backed `spam:{id}` check vs the in-memory limiter.
+
+usage: python bench/spam_bench.py [--calls 100000] [--users 10000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+from storage import SQLiteStore
+from ratelimit import TokenBucketLimiter
+
+SPAM_COOLDOWN_SEC = 5
+
+
+def db_check(db, user_id: str) -> bool:
+    """The pre-limiter logic from trial() step 1."""
+    now  = datetime.now(timezone.utc)
+    last = db.get(f"spam:{user_id}")
+    if last and (now - datetime.fromisoformat(last)).total_seconds() < SPAM_COOLDOWN_SEC:
+        return False
+    db[f"spam:{user_id}"] = now.isoformat()
+    return True
+
+
+def run(label, fn, ids):
+    start = time.perf_counter()
+    for uid in ids:
+        fn(uid)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {elapsed / len(ids) * 1e6:8.2f} µs/check")
+
+
+def main(calls: int, users: int):
+    ids = [str(random.randrange(users)) for _ in range(calls)]
+
+    sqlite_db = SQLiteStore(os.path.join(tempfile.mkdtemp(), "spam.db"))
+    dict_db   = {}
+    limiter   = TokenBucketLimiter(1 / SPAM_COOLDOWN_SEC, 1)
+
+    print(f"calls={calls} users={users}")
+    run("db check (dict)", lambda uid: db_check(dict_db, uid), ids)
+    run("db check (sqlite)", lambda uid: db_check(sqlite_db, uid), ids)
+    run("token bucket", limiter.hit, ids)
+    print(f"entries left: db={len(dict_db)} limiter={len(limiter)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    args = parser.parse_args()
+    main(args.calls, args.users)
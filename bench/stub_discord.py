@@ -0,0 +1,90 @@
+# bench/stub_discord.py
+import asyncio
+import json
+import socket
+import discord
+from aiohttp import web
+
+# ── Local stand-in for the Discord REST API and staff webhooks ──
+# Every route sleeps for `latency` seconds to mimic a real round-trip.
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# generous bucket headers so discord.py does not serialise requests
+RATELIMIT = {
+    "X-RateLimit-Limit": "10000", "X-RateLimit-Remaining": "9999",
+    "X-RateLimit-Reset-After": "1", "X-RateLimit-Bucket": "stub",
+}
+USER = {"id": "0", "username": "bench", "discriminator": "0", "avatar": None, "email": "bench@example.com"}
+
+
+def dm_channel(request) -> dict:
+    # the DM channel ID is the recipient's ID, so every user gets their own
+    rid = request["json"]["recipient_id"]
+    return {"id": str(rid), "type": 1, "last_message_id": None,
+            "recipients": [dict(USER, id=str(rid))]}
+
+
+def message(request) -> dict:
+    return {
+        "id": "2", "channel_id": request.match_info["cid"], "type": 0, "author": USER,
+        "content": "", "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None,
+        "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [],
+        "attachments": [], "embeds": [], "pinned": False,
+    }
+
+
+def make_app(latency: float = 0.05) -> web.Application:
+    app = web.Application()
+    app["hits"]  = {}
+    app["files"] = {}  # attachment name -> body, served under /attachments/
+
+    def route(name, payload, status=200):
+        async def handler(request):
+            app["hits"][name] = app["hits"].get(name, 0) + 1
+            body = await request.read()
+            if request.content_type == "application/json":
+                request["json"] = json.loads(body)
+            await asyncio.sleep(latency)
+            if status == 204:
+                return web.Response(status=204)
+            # discord.py only parses a bare "application/json" (no charset)
+            return web.Response(
+                body=json.dumps(payload(request)).encode(), status=status,
+                headers=dict(RATELIMIT, **{"Content-Type": "application/json"})
+            )
+        return handler
+
+    app.router.add_post("/oauth2/token", route("token", lambda r: {"access_token": "stub-token"}))
+    app.router.add_get("/users/@me", route("user", lambda r: USER))
+    app.router.add_post("/users/@me/channels", route("dm_open", dm_channel))
+    app.router.add_post("/channels/{cid}/messages", route("dm_send", message))
+    app.router.add_post("/webhook", route("webhook", None, status=204))
+
+    async def attachment(request):
+        body = app["files"].get(request.match_info["name"])
+        if body is None:
+            raise web.HTTPNotFound()
+        return web.Response(text=body)
+
+    app.router.add_get("/attachments/{name}", attachment)
+    return app
+
+
+async def start(port: int, latency: float = 0.05) -> web.AppRunner:
+    app    = make_app(latency)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def login(client: discord.Client, port: int):
+    """Point a discord.py client's REST calls at the stub and log it in."""
+    discord.http.Route.BASE = f"http://127.0.0.1:{port}"
+    await client.http.static_login("bench")
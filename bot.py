@@ -1,13 +1,29 @@
 # bot.py
 import os
-import secrets
+import json
+import math
+import hashlib
+import time
+import tempfile
+import asyncio
 import discord
 from discord import app_commands
 from discord.ui import View, Button
-from replit import db
-from datetime import datetime, timezone, timedelta
+from storage import db
 from log import notify_staff
+from pool import pool_size, page, export_keys, clear_pool, ensure_index, run_gc
+from key_import import KeyImport, stream_tokens, ALLOWED_SUFFIX
+from dispense import engine
+from records import UserRecord, load_user, run_migration
+from outbox import outbox
+from ledger import ledger
+from reminders import reminders
+from ratelimit import TokenBucketLimiter
+from states import create_state, run_sweeper
+from dispense_stats import stats as dispense_stats
 from typing import Optional
+from metrics import timed_command, GATEWAY_LATENCY
+from gateway import build_client
 import re
 
 # ── Config & Defaults ──
@@ -15,7 +31,6 @@ CLIENT_ID         = os.environ["CLIENT_ID"]
 BOT_TOKEN         = os.environ["BOT_TOKEN"]
 REDIRECT_URI      = os.environ["REDIRECT_URI"]
 OAUTH_BASE        = "https://discord.com/oauth2/authorize"
-STATE_TTL_HOURS   = 1
 
 # Multi-guild support: read GUILD_IDS or fall back to single GUILD_ID
 if os.environ.get("GUILD_IDS"):
@@ -25,6 +40,8 @@ else:
 
 DEFAULT_COOLDOWN  = 30  # days
 SPAM_COOLDOWN_SEC = 5   # seconds
+SPAM_BURST        = int(os.environ.get("SPAM_BURST", 1))
+SPAM_RATE         = float(os.environ.get("SPAM_RATE", 1 / SPAM_COOLDOWN_SEC))  # tokens/sec
 raw_staff = os.environ.get("STAFF_ROLE_IDS", "")
 raw_ids   = raw_staff.split(",") if raw_staff else []
 STAFF_ROLE_IDS = [
@@ -34,10 +51,16 @@ STAFF_ROLE_IDS = [
 ]
 ROLE_MENTIONS = [f"<@&{rid}>" for rid in STAFF_ROLE_IDS]
 LOW_POOL_THRESHOLD = 20
+PROGRESS_INTERVAL  = 2  # seconds between /add_keys progress edits
+LIST_PAGE_SIZE     = 25
+SYNC_CONCURRENCY   = int(os.environ.get("SYNC_CONCURRENCY", 5))  # guilds synced at once
+STARTED_AT         = time.monotonic()
 
-intents = discord.Intents.default()
-bot     = discord.Client(intents=intents)
-tree    = app_commands.CommandTree(bot)
+bot  = build_client(len(GUILD_IDS))
+tree = app_commands.CommandTree(bot)
+spam_limiter = TokenBucketLimiter(SPAM_RATE, SPAM_BURST)
+background   = {}  # name -> asyncio.Task, started once per process
+GATEWAY_LATENCY.set_function(lambda: bot.latency)
 
 # ── GLOBAL ERROR HANDLER ──
 @tree.error
@@ -64,47 +87,123 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
                 ephemeral=True
             )
 
-def parse_iso(ts: str) -> datetime:
-    return datetime.fromisoformat(ts)
-
 def is_staff():
     def pred(interaction: discord.Interaction) -> bool:
         return any(r.id in STAFF_ROLE_IDS for r in interaction.user.roles)
     return app_commands.check(pred)
 
+def start_pool_gc():
+    """Collect wiped key generations in the background (one task at a time)."""
+    task = background.get("pool_gc")
+    if task is None or task.done():
+        background["pool_gc"] = asyncio.create_task(run_gc())
+
+def purge_legacy_spam():
+    """One-off cleanup of the `spam:*` entries the old DB-backed limiter left behind."""
+    if db.get("migrated:spam"):
+        return
+    stale = list(db.scan("spam:"))
+    db.delete_many(stale)
+    db["migrated:spam"] = True
+    if stale:
+        print(f"[🔧] Purged {len(stale)} legacy spam entries")
+
 @bot.event
 async def on_ready():
-    # copy all global commands into each guild, then sync
-    for gid in GUILD_IDS:
-        guild_obj = discord.Object(id=gid)
-        tree.copy_global_to(guild=guild_obj)
-        await tree.sync(guild=guild_obj)
-    print(f"[✅] Bot ready as {bot.user} – commands synced to {GUILD_IDS}")
+    await asyncio.to_thread(ensure_index)
+    engine.start()
+    outbox.start(bot)
+    reminders.start(bot, DEFAULT_COOLDOWN)
+    bot.add_view(KeyActions())  # persistent: buttons keep working after restarts
+    if "legacy_spam" not in background:
+        # one HTTP call per entry on Replit; nothing waits on it
+        background["legacy_spam"] = asyncio.create_task(asyncio.to_thread(purge_legacy_spam))
+    if "state_sweeper" not in background:
+        background["state_sweeper"] = asyncio.create_task(run_sweeper())
+    if "record_migration" not in background:
+        # legacy user records also migrate lazily as they are read
+        background["record_migration"] = asyncio.create_task(run_migration())
+    if "ledger_compaction" not in background:
+        background["ledger_compaction"] = asyncio.create_task(ledger.run_compaction())
+    start_pool_gc()
+    # on_ready fires again after reconnects; commands only need syncing once
+    if "command_sync" in background:
+        print(f"[🔁] Reconnected as {bot.user}")
+        return
+    background["command_sync"] = asyncio.create_task(sync_commands())
+    synced, unchanged = await background["command_sync"]
+    print(
+        f"[✅] Bot ready as {bot.user} in {time.monotonic() - STARTED_AT:.1f}s – "
+        f"commands synced to {synced} guilds, {unchanged} unchanged"
+    )
+
+
+# ── Command sync ──
+# Each guild's command payload is hashed and stored under `sync:{guild_id}`;
+# guilds whose hash matches are skipped, the rest sync concurrently.
+def command_hash(guild: discord.Object) -> str:
+    payload = sorted((c.to_dict(tree) for c in tree.get_commands(guild=guild)), key=lambda c: c["name"])
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+async def sync_commands():
+    """Copy global commands into every guild and sync the changed ones; returns (synced, unchanged)."""
+    gate = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+    async def sync_guild(gid: int) -> bool:
+        guild = discord.Object(id=gid)
+        tree.copy_global_to(guild=guild)
+        digest = command_hash(guild)
+        if db.get(f"sync:{gid}") == digest:
+            return False
+        async with gate:
+            await tree.sync(guild=guild)
+        db[f"sync:{gid}"] = digest
+        return True
+
+    results = await asyncio.gather(*(sync_guild(gid) for gid in GUILD_IDS), return_exceptions=True)
+    for gid, result in zip(GUILD_IDS, results):
+        if isinstance(result, Exception):
+            print(f"[SYNC ERROR] guild {gid}: {result}")
+    return results.count(True), results.count(False)
 
 
 # ── /trial ──
+async def send_link_prompt(interaction: discord.Interaction, user_id: str):
+    """Follow up with the OAuth link button for a user who isn't linked."""
+    state = create_state(user_id)
+    oauth_url = (
+        f"{OAUTH_BASE}?client_id={CLIENT_ID}"
+        f"&redirect_uri={REDIRECT_URI}"
+        f"&response_type=code"
+        f"&scope=identify%20email"
+        f"&state={state}"
+    )
+    embed = discord.Embed(
+        title="🔗 Link Discord, key will be DMed!",
+        description="Click below to authorize.",
+        color=discord.Color.blurple()
+    )
+    view = View().add_item(Button(label="Link Discord", url=oauth_url))
+    return await interaction.followup.send(embed=embed, view=view)
+
 @tree.command(name="trial", description="🔑 Claim your free SkySpoofer trial key!")
 @app_commands.guild_only()
+@timed_command
 async def trial(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
-    now      = datetime.now(timezone.utc)
     user_id  = str(interaction.user.id)
-    user_key = f"user:{user_id}"
-
-    # 1) Anti-spam per user
-    last_spam = db.get(f"spam:{user_id}")
-    if last_spam:
-        diff = (now - parse_iso(last_spam)).total_seconds()
-        if diff < SPAM_COOLDOWN_SEC:
-            return await interaction.followup.send(
-                f"⚠️ Please wait **{int(SPAM_COOLDOWN_SEC - diff)}s** before retrying.",
-                ephemeral=True
-            )
-    db[f"spam:{user_id}"] = now.isoformat()
+
+    # 1) Anti-spam per user (in-memory token bucket)
+    wait = spam_limiter.hit(user_id)
+    if wait:
+        return await interaction.followup.send(
+            f"⚠️ Please wait **{math.ceil(wait)}s** before retrying.",
+            ephemeral=True
+        )
 
     # 2) Configurable cooldown
     cd_days  = db.get("config:cooldown_days", DEFAULT_COOLDOWN)
-    cooldown = timedelta(days=cd_days)
 
     # 3) Frozen check
     if db.get("frozen", False):
@@ -116,62 +215,18 @@ async def trial(interaction: discord.Interaction):
         )
 
     # 4) Not linked → send OAuth embed
-    if user_key not in db:
-        state = secrets.token_urlsafe(16)
-        db[f"state:{state}"] = {"user_id": user_id, "created_at": now.isoformat()}
-        oauth_url = (
-            f"{OAUTH_BASE}?client_id={CLIENT_ID}"
-            f"&redirect_uri={REDIRECT_URI}"
-            f"&response_type=code"
-            f"&scope=identify%20email"
-            f"&state={state}"
-        )
-        embed = discord.Embed(
-            title="🔗 Link Discord, key will be DMed!",
-            description="Click below to authorize.",
-            color=discord.Color.blurple()
-        )
-        view = View().add_item(Button(label="Link Discord", url=oauth_url))
-        return await interaction.followup.send(embed=embed, view=view)
-
-    user_data = db[user_key]
+    user = load_user(user_id)
+    if user is None:
+        return await send_link_prompt(interaction, user_id)
 
     # 5) Already has key? cooldown-aware ephemeral embed
-    if "dispensed_key" in user_data:
-        last = parse_iso(user_data["last_dispensed_at"])
-        elapsed = now - last
-        if elapsed < cooldown:
-            rem = cooldown - elapsed
-            d, s = rem.days, rem.seconds
-            h, m = s // 3600, (s % 3600) // 60
-
-            embed = discord.Embed(
-                title="🔁 Trial Key Already Claimed",
-                description=(
-                    f"**Key:** `{user_data['dispensed_key']}`\n\n"
-                    f"**Next free key in:** {d}d {h}h {m}m"
-                ),
-                color=discord.Color.orange()
-            )
-            # only visible to the user
-            await interaction.followup.send(embed=embed, ephemeral=True)
-
-            # log for staff
-            await notify_staff(
-                "⏳ Cooldown Active",
-                f"{interaction.user.mention} reminded of existing key; {d}d {h}h {m}m left.",
-                discord.Color.orange()
-            )
-            return
-
-        # cooldown passed: clear so we can dispense a fresh key
-        user_data.pop("dispensed_key", None)
-        user_data.pop("last_dispensed_at", None)
-        db[user_key] = user_data
-
+    rem = user.cooldown_left(cd_days)
+    if rem:
+        return await remind_cooldown(interaction, user, rem)
+    # cooldown passed (or no key yet): the engine overwrites the old key on dispense
 
     # 6) Low-pool alert
-    left = sum(1 for k in db if k.startswith("key:"))
+    left = pool_size()
     if left <= LOW_POOL_THRESHOLD and not db.get("warned_low_pool"):
         db["warned_low_pool"] = True
 
@@ -186,83 +241,181 @@ async def trial(interaction: discord.Interaction):
     elif left > LOW_POOL_THRESHOLD and db.get("warned_low_pool"):
         del db["warned_low_pool"]
 
-    # 7) Dispense loop with brief lock
-    db["frozen"] = True
-    try:
-        for k in list(db.keys()):
-            if k.startswith("key:"):
-                key_str = k.split("key:")[1]
-                # Assign to user & remove from pool
-                user_data["dispensed_key"]     = key_str
-                user_data["last_dispensed_at"] = now.isoformat()
-                db[user_key] = user_data
-                del db[k]
-
-                try:
-                    await interaction.user.send(
-                        f"🎉 Here’s your trial key:\n**{key_str}**\n"
-                        f"Next in {cd_days} days."
-                    )
-                    await interaction.followup.send(
-                        "✅ Trial key sent via DM!", ephemeral=True
-                    )
-                    await notify_staff(
-                        "🔑 Key Dispensed",
-                        f"{interaction.user.mention} was issued **{key_str}**.",
-                        discord.Color.green()
-                    )
-                except discord.Forbidden:
-                    await interaction.followup.send(
-                        "⚠️ Please open your DMs so I can send your key.",
-                        ephemeral=True
-                    )
-                    await notify_staff(
-                        "📭 DM Delivery Failed",
-                        f"Could not DM {interaction.user.mention} **{key_str}**.",
-                        discord.Color.orange()
-                    )
-                return
-
+    # 7) Dispense via the single-writer engine
+    claim = await engine.claim(user_id, cd_days, deliver="trial")
+    if claim.status == "busy":
+        # the same user is mid-claim on another replica
+        return await interaction.followup.send(
+            "⏳ Your claim is already being processed—try again in a moment.",
+            ephemeral=True
+        )
+    if claim.status == "active":
+        # another claim (e.g. OAuth auto-dispense) won the race
+        return await remind_cooldown(interaction, claim.user, claim.user.cooldown_left(cd_days))
+    if claim.status == "unlinked":
+        # unlinked (e.g. /unlink) since the check above
+        return await send_link_prompt(interaction, user_id)
+    if claim.status != "issued":
         # Pool exhausted
         await interaction.followup.send(
             "❌ All trial keys claimed—check back later or message staff.",
             ephemeral=True
         )
-        await notify_staff(
+        return await notify_staff(
             "❌ Pool Exhausted",
             f"{interaction.user.mention} attempted to claim but no keys left.",
             discord.Color.red()
         )
-    finally:
-        db["frozen"] = False
+
+    # the engine queued the DM; acknowledge now, deliver in the background
+    await interaction.followup.send(
+        "✅ Trial key issued—it’s on its way to your DMs.",
+        view=KeyActions(),
+        ephemeral=True
+    )
+    await notify_staff(
+        "🔑 Key Dispensed",
+        f"{interaction.user.mention} was issued **{claim.key}**.",
+        discord.Color.green()
+    )
+
+
+class KeyActions(View):
+    """Persistent "Retry delivery" and "Remind me" buttons shown with an issued key."""
+
+    def __init__(self):
+        super().__init__(timeout=None)
+
+    @discord.ui.button(label="Retry delivery", emoji="📨", style=discord.ButtonStyle.secondary,
+                       custom_id="outbox:retry")
+    async def retry_button(self, interaction: discord.Interaction, button: Button):
+        user_id = str(interaction.user.id)
+        wait = spam_limiter.hit(user_id)
+        if wait:
+            return await interaction.response.send_message(
+                f"⚠️ Please wait **{math.ceil(wait)}s** before retrying.", ephemeral=True
+            )
+        key = outbox.redeliver(user_id, db.get("config:cooldown_days", DEFAULT_COOLDOWN))
+        if key is None:
+            return await interaction.response.send_message(
+                "ℹ️ You don’t have a key to deliver—use /trial first.", ephemeral=True
+            )
+        await interaction.response.send_message(
+            "📨 Delivery re-queued—make sure your DMs are open.", ephemeral=True
+        )
+
+    @discord.ui.button(label="Remind me", emoji="🔔", style=discord.ButtonStyle.secondary,
+                       custom_id="reminder:opt_in")
+    async def remind_button(self, interaction: discord.Interaction, button: Button):
+        user = load_user(interaction.user.id)
+        rem  = user.cooldown_left(db.get("config:cooldown_days", DEFAULT_COOLDOWN)) if user else 0
+        if not rem or not reminders.opt_in(user):
+            return await interaction.response.send_message(
+                "ℹ️ Your next trial is already available—use /trial.", ephemeral=True
+            )
+        await interaction.response.send_message(
+            f"🔔 I’ll DM you when your next trial is ready (<t:{int(time.time()) + rem}:R>).",
+            ephemeral=True
+        )
+
+
+async def remind_cooldown(interaction: discord.Interaction, user: UserRecord, rem: int):
+    """Show the user their current key and `rem` seconds left until the next one."""
+    d, s = divmod(rem, 86400)
+    h, m = s // 3600, (s % 3600) // 60
+
+    embed = discord.Embed(
+        title="🔁 Trial Key Already Claimed",
+        description=(
+            f"**Key:** `{user.key}`\n\n"
+            f"**Next free key in:** {d}d {h}h {m}m"
+        ),
+        color=discord.Color.orange()
+    )
+    # only visible to the user
+    await interaction.followup.send(embed=embed, view=KeyActions(), ephemeral=True)
+
+    # log for staff
+    await notify_staff(
+        "⏳ Cooldown Active",
+        f"{interaction.user.mention} reminded of existing key; {d}d {h}h {m}m left.",
+        discord.Color.orange()
+    )
+
+
+# ── Admin: List available keys (paginated) ──
+class KeyPager(View):
+    """Next/prev pages over the pool index plus a full export button."""
+
+    def __init__(self, owner_id: int):
+        super().__init__(timeout=300)
+        self.owner_id = owner_id
+        self.cursor   = None  # slot cursor of the current page
+        self.next     = None  # slot cursor of the following page
+        self.history  = []    # cursors of earlier pages, for "prev"
+
+    def render(self) -> discord.Embed:
+        keys, self.next = page(self.cursor, LIST_PAGE_SIZE)
+        self.prev_button.disabled = not self.history
+        self.next_button.disabled = self.next is None
+        return discord.Embed(
+            title=f"🔑 Available Keys ({pool_size()})",
+            description="\n".join(f"- {key}" for key in keys) or "None",
+            color=discord.Color.blurple()
+        ).set_footer(text=f"Page {len(self.history) + 1}")
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.owner_id
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_button(self, interaction: discord.Interaction, button: Button):
+        self.cursor = self.history.pop()
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_button(self, interaction: discord.Interaction, button: Button):
+        self.history.append(self.cursor)
+        self.cursor = self.next
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(label="Export", emoji="📄", style=discord.ButtonStyle.primary)
+    async def export_button(self, interaction: discord.Interaction, button: Button):
+        await send_key_export(interaction)
+
+
+async def send_key_export(interaction: discord.Interaction):
+    """Stream the whole pool into a temp file and send it as an attachment."""
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as fp:
+        count = await asyncio.to_thread(export_keys, fp)
+        fp.flush()
+        fp.buffer.seek(0)
+        await interaction.followup.send(
+            f"📄 Exported {count} keys.",
+            file=discord.File(fp.buffer, filename="keys.txt"),
+            ephemeral=True
+        )
 
 
-# ── Admin: List available keys only ──
 @tree.command(
     name="list_keys",
     description="📜 List all available keys",
 )
 @is_staff()
 @app_commands.guild_only()
-async def list_keys(interaction: discord.Interaction):
-    # Fetch all remaining keys
-    available = [k.split("key:")[1] for k in db if k.startswith("key:")]
-    count     = len(available)
-
-    # Build an embed with one key per line, prefixed by '-'
-    embed = discord.Embed(
-        title=f"🔑 Available Keys ({count})",
-        description="\n".join(f"- {key}" for key in available) or "None",
-        color=discord.Color.blurple()
-    )
-
-    # Send it ephemerally to the admin
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+@timed_command
+async def list_keys(interaction: discord.Interaction, export: bool = False):
+    if export:
+        await send_key_export(interaction)
+    else:
+        # one page at a time, read straight from the pool index
+        pager = KeyPager(interaction.user.id)
+        await interaction.response.send_message(embed=pager.render(), view=pager, ephemeral=True)
 
     # Log to staff channel
     await notify_staff(
         "📜 Keys Queried",
-        f"{interaction.user.mention} ran /list_keys; {count} keys remaining.",
+        f"{interaction.user.mention} ran /list_keys; {pool_size()} keys remaining.",
         discord.Color.blue()
     )
 
@@ -271,10 +424,12 @@ async def list_keys(interaction: discord.Interaction):
 @tree.command(name="set_cooldown_days", description="⏲️ Set trial cooldown")
 @is_staff()
 @app_commands.guild_only()
+@timed_command
 async def set_cooldown_days(interaction: discord.Interaction, days: int):
     if not 0 <= days <= 365:
         return await interaction.response.send_message("❌ Days must be 0–365.", ephemeral=True)
     db["config:cooldown_days"] = days
+    reminders.reschedule()  # expiries are filed by dispense time, so they all move at once
     await interaction.response.send_message(f"✅ Cooldown set to {days} days.", ephemeral=True)
     await notify_staff(
         "⏲️ Cooldown Updated",
@@ -287,6 +442,7 @@ async def set_cooldown_days(interaction: discord.Interaction, days: int):
 @tree.command(name="freeze", description="⏸️ Pause key disbursement")
 @is_staff()
 @app_commands.guild_only()
+@timed_command
 async def freeze(interaction: discord.Interaction):
     db["frozen"] = True
     await interaction.response.send_message("🔒 Disbursement frozen.", ephemeral=True)
@@ -299,6 +455,7 @@ async def freeze(interaction: discord.Interaction):
 @tree.command(name="unfreeze", description="▶️ Resume key disbursement")
 @is_staff()
 @app_commands.guild_only()
+@timed_command
 async def unfreeze(interaction: discord.Interaction):
     db["frozen"] = False
     await interaction.response.send_message("🔓 Disbursement resumed.", ephemeral=True)
@@ -310,30 +467,50 @@ async def unfreeze(interaction: discord.Interaction):
 
 
 # ── Admin: Add trial keys ──
-@tree.command(name="add_keys", description="➕ Add trial keys (comma-separated)")
+@tree.command(name="add_keys", description="➕ Add trial keys (comma-separated or .txt/.csv file)")
 @is_staff()
 @app_commands.guild_only()
-async def add_keys(interaction: discord.Interaction, keys: str):
-    added = skipped = invalid = 0
-    for raw in keys.split(","):
-        k = raw.strip()
-        if not k or " " in k:
-            invalid += 1
-            continue
-        db_key = f"key:{k}"
-        if db_key in db:
-            skipped += 1
-        else:
-            db[db_key] = {}
-            added += 1
-
-    msg = f"✅ Added {added} keys."
-    if skipped: msg += f" Skipped {skipped} duplicates."
-    if invalid: msg += f" Ignored {invalid} invalid."
-    await interaction.response.send_message(msg, ephemeral=True)
+@timed_command
+async def add_keys(
+    interaction: discord.Interaction,
+    keys: Optional[str] = None,
+    file: Optional[discord.Attachment] = None
+):
+    await interaction.response.defer(ephemeral=True)
+    if not keys and not file:
+        return await interaction.followup.send(
+            "❌ Provide comma-separated keys or attach a .txt/.csv file.", ephemeral=True
+        )
+    if file and not file.filename.lower().endswith(ALLOWED_SUFFIX):
+        return await interaction.followup.send("❌ Attach a .txt or .csv file.", ephemeral=True)
+
+    job = KeyImport()
+    if keys:
+        for raw in keys.split(","):
+            await job.feed(raw)
+
+    if file:
+        progress = await interaction.followup.send("⏳ Importing keys…", ephemeral=True, wait=True)
+        last_report = time.monotonic()
+        try:
+            async for token in stream_tokens(file.url):
+                await job.feed(token)
+                if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                    last_report = time.monotonic()
+                    await progress.edit(
+                        content=f"⏳ Importing… {job.added + len(job.pending)} new, "
+                                f"{job.skipped} duplicates, {job.invalid} invalid"
+                    )
+        finally:
+            await job.flush()
+        await progress.edit(content=job.summary())
+    else:
+        await job.flush()
+        await interaction.followup.send(job.summary(), ephemeral=True)
+
     await notify_staff(
         "➕ Keys Added",
-        f"{interaction.user.mention} added {added} keys; skipped {skipped}; invalid {invalid}.",
+        f"{interaction.user.mention} added {job.added} keys; skipped {job.skipped}; invalid {job.invalid}.",
         discord.Color.green()
     )
 
@@ -342,15 +519,14 @@ async def add_keys(interaction: discord.Interaction, keys: str):
 @tree.command(name="delete_all_keys", description="🗑️ Wipe all keys")
 @is_staff()
 @app_commands.guild_only()
+@timed_command
 async def delete_all_keys(interaction: discord.Interaction):
-    # Remove every “key:” entry from the DB
-    count = 0
-    for k in list(db.keys()):
-        if k.startswith("key:"):
-            db.pop(k, None)
-            count += 1
-
-    await interaction.response.send_message(f"🧨 Deleted {count} keys.", ephemeral=True)
+    # Retire the current key generation; old entries are collected lazily
+    await interaction.response.defer(ephemeral=True)
+    count = await asyncio.to_thread(clear_pool)  # may wait on the queue lease
+    start_pool_gc()
+
+    await interaction.followup.send(f"🧨 Deleted {count} keys.", ephemeral=True)
     await notify_staff(
         "🧨 All Keys Wiped",
         f"{interaction.user.mention} deleted {count} keys from DB.",
@@ -362,47 +538,122 @@ async def delete_all_keys(interaction: discord.Interaction):
 @tree.command(name="status", description="📊 Show key-distribution status")
 @is_staff()
 @app_commands.guild_only()
+@timed_command
 async def status(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
-    now = datetime.now(timezone.utc)
-
-    # 1) Purge stale OAuth states
-    for key in list(db.keys()):
-        if key.startswith("state:"):
-            entry = db[key]
-            if isinstance(entry, dict) and "created_at" in entry:
-                created = parse_iso(entry["created_at"])
-                if now - created > timedelta(hours=STATE_TTL_HOURS):
-                    del db[key]
-            else:
-                del db[key]
-
-    # 2) Metrics
-    remaining = sum(1 for k in db if k.startswith("key:"))
-    disp24 = disp7 = 0
-    for k, v in db.items():
-        if k.startswith("user:") and "last_dispensed_at" in v:
-            delta = now - parse_iso(v["last_dispensed_at"])
-            if delta <= timedelta(days=1):
-                disp24 += 1
-            if delta <= timedelta(days=7):
-                disp7 += 1
-
-    frozen = db.get("frozen", False)
-
-    # 3) Single-embed response
+
+    # 1) Metrics (incrementally maintained, no user scan)
+    remaining = pool_size()
+    rates     = await asyncio.to_thread(dispense_stats.snapshot, remaining)
+    frozen    = db.get("frozen", False)
+    dms       = outbox.counts()
+    if rates["exhausts_at"] is None:
+        exhausts = "never at current rate"
+    else:
+        exhausts = f"<t:{int(rates['exhausts_at'])}:R>"
+
+    # 2) Single-embed response
     embed = discord.Embed(
         title="SkySpoofer Key Distribution Status",
         description=(
             f"**Remaining Keys:** {remaining}\n"
-            f"**Frozen:** {'Yes' if frozen else 'No'}"
+            f"**Frozen:** {'Yes' if frozen else 'No'}\n\n"
+            f"**Dispensed:** {rates['1h']} (1h) · {rates['24h']} (24h) · "
+            f"{rates['7d']} (7d) · {rates['30d']} (30d)\n"
+            f"**Burn Rate:** {rates['burn_per_hour']:.1f} keys/hour (24h avg)\n"
+            f"**Pool Exhausted:** {exhausts}\n"
+            f"**DM Outbox:** {dms['pending']} pending · {dms['blocked']} blocked · {dms['failed']} failed\n"
+            f"**Cooldowns Ending (1h):** {reminders.upcoming()}"
         ),
         color=discord.Color.blurple()
     )
+    if hasattr(db, "stats"):
+        cache = db.stats()
+        embed.set_footer(text=f"Cache: {cache['hits']} hits / {cache['misses']} misses")
     await interaction.followup.send(embed=embed, ephemeral=True)
     await notify_staff(
         "📊 Admin Queried Status",
-        f"{interaction.user.mention} ran /status (stale states purged).",
+        f"{interaction.user.mention} ran /status.",
+        discord.Color.blue()
+    )
+
+
+# ── Admin: Resend Key ──
+@tree.command(name="resend_key", description="📨 Re-send a user's trial key by DM")
+@is_staff()
+@app_commands.guild_only()
+@timed_command
+async def resend_key(interaction: discord.Interaction, user: discord.Member):
+    key = outbox.redeliver(str(user.id), db.get("config:cooldown_days", DEFAULT_COOLDOWN))
+    if key is None:
+        return await interaction.response.send_message(
+            f"ℹ️ {user.mention} has no key to resend.", ephemeral=True
+        )
+    ledger.append("delivery", user.id, key, status="resent", by=str(interaction.user.id))
+    await interaction.response.send_message(
+        f"📨 Re-queued **{key}** for {user.mention}.", ephemeral=True
+    )
+    await notify_staff(
+        "📨 Key Resent",
+        f"{interaction.user.mention} re-queued delivery of **{key}** to {user.mention}.",
+        discord.Color.blue()
+    )
+
+
+# ── Admin: Ledger queries ──
+LEDGER_ICONS = {"dispense": "🔑", "link": "🔗", "unlink": "🔄", "delivery": "📨"}
+
+
+def describe_event(rec: dict, show_user: bool) -> str:
+    line = f"<t:{rec['ts']}:f> {LEDGER_ICONS.get(rec['event'], '•')} **{rec['event']}**"
+    if show_user:
+        line += f" <@{rec['user']}>"
+    if rec.get("key"):
+        line += f" `{rec['key']}`"
+    if rec.get("status"):
+        line += f" ({rec['status']})"
+    if rec.get("by"):
+        line += f" by <@{rec['by']}>"
+    return line
+
+
+async def send_ledger(interaction: discord.Interaction, title: str, query, show_user: bool):
+    """Run a ledger `query` off the event loop and reply with its events, newest first."""
+    start  = time.perf_counter()
+    events = await asyncio.to_thread(query)
+    took = (time.perf_counter() - start) * 1000
+    embed = discord.Embed(
+        title=title,
+        description="\n".join(describe_event(e, show_user) for e in events) or "No ledger events.",
+        color=discord.Color.blurple()
+    )
+    embed.set_footer(text=f"{len(events)} newest events · {took:.1f} ms")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+@tree.command(name="history", description="📜 Show a user's ledger history")
+@is_staff()
+@app_commands.guild_only()
+@timed_command
+async def history(interaction: discord.Interaction, user: discord.User):
+    await send_ledger(interaction, f"📜 History of {user}", lambda: ledger.history(user.id), show_user=False)
+    await notify_staff(
+        "📜 Admin Queried History",
+        f"{interaction.user.mention} ran /history for {user.mention}.",
+        discord.Color.blue()
+    )
+
+
+@tree.command(name="whois", description="🔍 Show who was issued a key")
+@is_staff()
+@app_commands.guild_only()
+@timed_command
+async def whois(interaction: discord.Interaction, key: str):
+    key = key.strip()
+    await send_ledger(interaction, f"🔍 Ledger for {key}", lambda: ledger.whois(key), show_user=True)
+    await notify_staff(
+        "🔍 Admin Queried Key",
+        f"{interaction.user.mention} ran /whois for **{key}**.",
         discord.Color.blue()
     )
 
@@ -411,6 +662,7 @@ async def status(interaction: discord.Interaction):
 @tree.command(name="unlink", description="🔄 Unlink a user")
 @is_staff()
 @app_commands.guild_only()
+@timed_command
 async def unlink(
     interaction: discord.Interaction,
     user: Optional[discord.Member] = None
@@ -420,7 +672,10 @@ async def unlink(
 
     if ukey in db:
         # Only remove the user record; keys were already deleted on dispense
+        linked = load_user(target.id, fresh=True)
         del db[ukey]
+        reminders.forget(linked)
+        ledger.append("unlink", target.id, by=str(interaction.user.id))
 
         await interaction.response.send_message(
             f"🔄 Unlinked {target.mention}.",
@@ -436,8 +691,3 @@ async def unlink(
             f"ℹ️ {target.mention} not linked.",
             ephemeral=True
         )
-
-
-# ── Entrypoint ──
-def run_bot():
-    bot.run(BOT_TOKEN)
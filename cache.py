@@ -0,0 +1,168 @@
+# cache.py
+import os
+import copy
+import time
+import threading
+from collections import OrderedDict
+from storage import Store
+from coordination import COORDINATOR
+
+# ── Config ──
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))  # records
+USER_CACHE_TTL  = int(os.environ.get("USER_CACHE_TTL", 300))     # seconds
+# A lone replica sees every write, so flags and config can stay resident
+# for the life of the process; with several, another replica's /freeze or
+# /set_cooldown_days must show up within a few seconds.
+RESIDENT_TTL    = float(os.environ.get("RESIDENT_TTL", "inf" if COORDINATOR == "local" else 5))
+
+RESIDENT_KEYS     = {"frozen", "warned_low_pool", "pool:gen"}
+RESIDENT_PREFIXES = ("config:",)
+USER_PREFIX       = "user:"
+
+_MISSING = object()  # not in the cache
+_ABSENT  = object()  # cached: not in the backend either
+
+
+def _copy(value):
+    # callers mutate records before writing them back; never hand out ours
+    return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+
+
+# ── Write-through cache ──
+class CachedStore(Store):
+    """Write-through cache in front of another Store.
+
+    Config and flags are kept resident for RESIDENT_TTL; `user:*` records sit
+    in an LRU with size and TTL bounds. Every write goes to the backend first
+    and then refreshes the cache, so writes made through this store invalidate it.
+    """
+
+    def __init__(self, backend: Store, user_size: int = USER_CACHE_SIZE, user_ttl: float = USER_CACHE_TTL,
+                 resident_ttl: float = RESIDENT_TTL):
+        self.backend      = backend
+        self.user_size    = user_size
+        self.user_ttl     = user_ttl
+        self.resident_ttl = resident_ttl
+        self.hits         = 0
+        self.misses       = 0
+        self._resident    = {}             # key -> (value, expires_at)
+        self._users       = OrderedDict()  # key -> (value, expires_at)
+        self._lock        = threading.RLock()
+
+    # ── cache bookkeeping ──
+    def _cacheable(self, key: str):
+        if key in RESIDENT_KEYS or key.startswith(RESIDENT_PREFIXES):
+            return "resident"
+        if key.startswith(USER_PREFIX):
+            return "user"
+        return None
+
+    def _lookup(self, key: str, kind: str):
+        cache = self._resident if kind == "resident" else self._users
+        entry = cache.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del cache[key]
+            return _MISSING
+        if kind == "user":
+            self._users.move_to_end(key)
+        return value
+
+    def _remember(self, key: str, value):
+        kind = self._cacheable(key)
+        if kind is None:
+            return
+        value = value if value is _ABSENT else _copy(value)
+        if kind == "resident":
+            self._resident[key] = (value, time.monotonic() + self.resident_ttl)
+        elif kind == "user":
+            self._users[key] = (value, time.monotonic() + self.user_ttl)
+            self._users.move_to_end(key)
+            while len(self._users) > self.user_size:
+                self._users.popitem(last=False)
+
+    def invalidate(self, key: str = None):
+        """Forget one cached key, or everything."""
+        with self._lock:
+            if key is None:
+                self._resident.clear()
+                self._users.clear()
+            else:
+                self._resident.pop(key, None)
+                self._users.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "users": len(self._users),
+                "resident": len(self._resident),
+            }
+
+    # ── Store interface ──
+    def get(self, key, default=None):
+        kind = self._cacheable(key)
+        if kind is None:
+            return self.backend.get(key, default)
+        with self._lock:
+            value = self._lookup(key, kind)
+            if value is not _MISSING:
+                self.hits += 1
+                return default if value is _ABSENT else _copy(value)
+            self.misses += 1
+        return self.get_fresh(key, default)
+
+    def get_fresh(self, key, default=None):
+        value = self.backend.get(key, _MISSING)
+        with self._lock:
+            # absent entries are cached too so repeat misses stay local
+            self._remember(key, _ABSENT if value is _MISSING else value)
+        return default if value is _MISSING else value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+        with self._lock:
+            self._remember(key, value)
+
+    def delete(self, key):
+        existed = self.backend.delete(key)
+        with self._lock:
+            self._remember(key, _ABSENT)
+        return existed
+
+    def pop(self, key, default=None):
+        value = self.backend.pop(key, default)
+        with self._lock:
+            self._remember(key, _ABSENT)
+        return value
+
+    def incr(self, key, delta=1):
+        value = self.backend.incr(key, delta)
+        with self._lock:
+            self._remember(key, value)
+        return value
+
+    def set_many(self, items):
+        self.backend.set_many(items)
+        with self._lock:
+            for key, value in items.items():
+                self._remember(key, value)
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        self.backend.delete_many(keys)
+        with self._lock:
+            for key in keys:
+                self._remember(key, _ABSENT)
+
+    def scan(self, prefix=""):
+        return self.backend.scan(prefix)
+
+    def items(self, prefix=""):
+        return self.backend.items(prefix)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
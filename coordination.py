@@ -0,0 +1,225 @@
+# coordination.py
+import os
+import abc
+import time
+import socket
+import sqlite3
+import threading
+import contextlib
+from typing import NamedTuple, Optional
+
+# ── Config ──
+# COORDINATOR=local (default) only coordinates within this process, which
+# is all a single replica needs; COORDINATOR=sqlite shares leases through
+# a database file so several replicas can dispense side by side.
+COORDINATOR      = os.environ.get("COORDINATOR", "local").lower()
+COORDINATOR_PATH = os.environ.get("COORDINATOR_PATH", "coord.db")
+REPLICA_ID       = os.environ.get("REPLICA_ID", "")
+OWNER            = f"{REPLICA_ID or socket.gethostname()}:{os.getpid()}"
+LEASE_TTL        = 30  # seconds
+
+
+def next_token(last: int) -> int:
+    """A fencing token above `last` and above any token from an earlier run."""
+    return max(last + 1, time.time_ns())
+
+
+class Lease(NamedTuple):
+    name: str
+    owner: str
+    token: int         # fencing token, strictly increasing across grants and restarts
+    expires_at: float
+
+
+class Coordinator(abc.ABC):
+    """Leases with fencing tokens plus compare-and-set reservations.
+
+    A lease is exclusive until released or expired. Every grant carries a
+    larger token than any before it, so a holder whose lease lapsed (say,
+    a paused replica) can be told apart from the current one. Tokens are
+    kept in user records, so they follow the wall clock (next_token)
+    rather than restarting from 0. A reservation ties a resource to one
+    lease: reserve() only succeeds if the resource is free or its
+    previous holder's lease is no longer live.
+    """
+
+    @abc.abstractmethod
+    def acquire(self, name: str, ttl: float = LEASE_TTL, owner: str = OWNER) -> Optional[Lease]:
+        """Take the lease on `name`; None if someone else holds it."""
+
+    @abc.abstractmethod
+    def release(self, lease: Lease) -> None:
+        ...
+
+    @abc.abstractmethod
+    def is_current(self, lease: Lease) -> bool:
+        """True while `lease` is unexpired and not superseded."""
+
+    @abc.abstractmethod
+    def reserve(self, resource: str, lease: Lease) -> bool:
+        """Compare-and-set `resource` to `lease`; False if a live lease holds it."""
+
+    @abc.abstractmethod
+    def unreserve(self, resource: str, lease: Lease) -> None:
+        ...
+
+    @contextlib.contextmanager
+    def hold(self, name: str, wait: float = 5, ttl: float = LEASE_TTL):
+        """Block (briefly) until the lease on `name` is ours; release on exit.
+
+        This sleeps the calling thread, so callers on the event loop go
+        through asyncio.to_thread.
+        """
+        deadline = time.monotonic() + wait
+        while (lease := self.acquire(name, ttl)) is None:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"lease {name!r} is busy")
+            time.sleep(0.005)
+        try:
+            yield lease
+        finally:
+            self.release(lease)
+
+
+# ── In-process stand-in ──
+class LocalCoordinator(Coordinator):
+    def __init__(self):
+        self._leases   = {}  # name -> Lease
+        self._reserved = {}  # resource -> Lease
+        self._token    = 0   # last token granted
+        self._lock     = threading.Lock()
+
+    def _live(self, lease: Optional[Lease], now: float) -> bool:
+        return lease is not None and lease.expires_at > now and self._leases.get(lease.name) == lease
+
+    def acquire(self, name, ttl=LEASE_TTL, owner=OWNER):
+        now = time.time()
+        with self._lock:
+            if self._live(self._leases.get(name), now):
+                return None
+            self._token = next_token(self._token)
+            lease = self._leases[name] = Lease(name, owner, self._token, now + ttl)
+            return lease
+
+    def release(self, lease):
+        with self._lock:
+            if self._leases.get(lease.name) == lease:
+                del self._leases[lease.name]
+
+    def is_current(self, lease):
+        with self._lock:
+            return self._live(lease, time.time())
+
+    def reserve(self, resource, lease):
+        now = time.time()
+        with self._lock:
+            held = self._reserved.get(resource)
+            if held is not None and held != lease and self._live(held, now):
+                return False
+            if not self._live(lease, now):
+                return False
+            self._reserved[resource] = lease
+            return True
+
+    def unreserve(self, resource, lease):
+        with self._lock:
+            if self._reserved.get(resource) == lease:
+                del self._reserved[resource]
+
+
+# ── SQLite-backed coordinator ──
+# Every operation is one IMMEDIATE transaction, so replicas sharing the
+# file see a single order of grants and reservations.
+class SQLiteCoordinator(Coordinator):
+    def __init__(self, path: str = COORDINATOR_PATH):
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases "
+            "(name TEXT PRIMARY KEY, owner TEXT NOT NULL, token INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reservations "
+            "(resource TEXT PRIMARY KEY, name TEXT NOT NULL, token INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS fence (id INTEGER PRIMARY KEY, token INTEGER NOT NULL)")
+
+    @contextlib.contextmanager
+    def _tx(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _live(conn, name: str, token: int, now: float) -> bool:
+        row = conn.execute(
+            "SELECT 1 FROM leases WHERE name = ? AND token = ? AND expires_at > ?", (name, token, now)
+        ).fetchone()
+        return row is not None
+
+    def acquire(self, name, ttl=LEASE_TTL, owner=OWNER):
+        now = time.time()
+        with self._tx() as conn:
+            held = conn.execute("SELECT expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if held is not None and held[0] > now:
+                return None
+            token = conn.execute(
+                "INSERT INTO fence (id, token) VALUES (0, ?) "
+                "ON CONFLICT(id) DO UPDATE SET token = MAX(token + 1, excluded.token) RETURNING token",
+                (next_token(0),)
+            ).fetchone()[0]
+            lease = Lease(name, owner, token, now + ttl)
+            conn.execute(
+                "INSERT INTO leases (name, owner, token, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, "
+                "token = excluded.token, expires_at = excluded.expires_at",
+                lease
+            )
+            return lease
+
+    def release(self, lease):
+        with self._tx() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND token = ?", (lease.name, lease.token))
+
+    def is_current(self, lease):
+        with self._lock:
+            return self._live(self._conn, lease.name, lease.token, time.time())
+
+    def reserve(self, resource, lease):
+        now = time.time()
+        with self._tx() as conn:
+            held = conn.execute(
+                "SELECT name, token FROM reservations WHERE resource = ?", (resource,)
+            ).fetchone()
+            if held is not None and held[1] != lease.token and self._live(conn, *held, now):
+                return False
+            if not self._live(conn, lease.name, lease.token, now):
+                return False
+            conn.execute(
+                "INSERT INTO reservations (resource, name, token) VALUES (?, ?, ?) "
+                "ON CONFLICT(resource) DO UPDATE SET name = excluded.name, token = excluded.token",
+                (resource, lease.name, lease.token)
+            )
+            return True
+
+    def unreserve(self, resource, lease):
+        with self._tx() as conn:
+            conn.execute("DELETE FROM reservations WHERE resource = ? AND token = ?", (resource, lease.token))
+
+
+def open_coordinator(kind: str = COORDINATOR) -> Coordinator:
+    if kind == "local":
+        return LocalCoordinator()
+    if kind == "sqlite":
+        return SQLiteCoordinator()
+    raise ValueError(f"Unknown COORDINATOR: {kind!r}")
+
+
+coord = open_coordinator()
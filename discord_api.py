@@ -0,0 +1,75 @@
+# discord_api.py
+import os
+import aiohttp
+from metrics import timed_stage
+
+# ── Config ──
+API_BASE      = os.environ.get("DISCORD_API_BASE", "https://discord.com/api/v10")
+CLIENT_ID     = os.environ["CLIENT_ID"]
+CLIENT_SECRET = os.environ["CLIENT_SECRET"]
+REDIRECT_URI  = os.environ["REDIRECT_URI"]
+
+# per-call budgets (seconds)
+TOKEN_TIMEOUT = aiohttp.ClientTimeout(total=10)
+USER_TIMEOUT  = aiohttp.ClientTimeout(total=5)
+
+# ── Shared connection pool ──
+# One keep-alive pool per process: the OAuth calls below, /add_keys attachment
+# downloads, the staff webhook notifier and the bot's own REST client (see
+# main.py) all draw from it.
+_connector = None
+_session   = None
+
+
+def shared_connector() -> aiohttp.TCPConnector:
+    global _connector
+    if _connector is None or _connector.closed:
+        _connector = aiohttp.TCPConnector(limit=100, keepalive_timeout=30, ttl_dns_cache=300)
+    return _connector
+
+
+def get_session() -> aiohttp.ClientSession:
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(connector=shared_connector(), connector_owner=False)
+    return _session
+
+
+async def close_session():
+    global _session, _connector
+    if _session is not None and not _session.closed:
+        await _session.close()
+    if _connector is not None:
+        await _connector.close()
+    _session = _connector = None
+
+
+# ── OAuth ──
+@timed_stage("token_exchange")
+async def exchange_code(code: str) -> str:
+    """Trade an authorization code for a user access token."""
+    async with get_session().post(
+        f"{API_BASE}/oauth2/token",
+        data={
+            "client_id": CLIENT_ID,
+            "client_secret": CLIENT_SECRET,
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": REDIRECT_URI,
+            "scope": "identify email"
+        },
+        timeout=TOKEN_TIMEOUT
+    ) as resp:
+        resp.raise_for_status()
+        return (await resp.json())["access_token"]
+
+
+@timed_stage("user_fetch")
+async def fetch_user(access_token: str) -> dict:
+    async with get_session().get(
+        f"{API_BASE}/users/@me",
+        headers={"Authorization": f"Bearer {access_token}"},
+        timeout=USER_TIMEOUT
+    ) as resp:
+        resp.raise_for_status()
+        return await resp.json()
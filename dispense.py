@@ -0,0 +1,176 @@
+# dispense.py
+import asyncio
+import threading
+from collections import deque
+import time
+from typing import NamedTuple, Optional
+from storage import db
+import pool
+from dispense_stats import stats
+from coordination import coord, Lease
+from outbox import outbox, entry_key, new_entry
+from records import UserRecord, load_user, user_key
+from ledger import ledger
+from reminders import reminders, marker, index_entry
+
+BUFFER_SIZE = 10  # keys pre-reserved in memory
+
+
+class Claim(NamedTuple):
+    status: str              # "issued" | "active" | "empty" | "unlinked" | "busy"
+    key: Optional[str]
+    user: Optional[UserRecord]
+
+
+# ── Dispense Engine ──
+# A single asyncio actor owns every key hand-out. /trial and the OAuth
+# callback both submit claims to its queue; it processes them one at a time,
+# so keys leave the pool in order and can never be issued twice. Each claim
+# runs in a worker thread so its storage calls never stall the event loop.
+#
+# Across replicas each claim runs under a per-user lease (`claim:{id}`):
+# a second replica answers "busy" instead of dispensing inside the
+# cooldown. Every key is reserved by compare-and-set against that lease
+# before it is consumed, and the user record carries the lease's fencing
+# token so a replica whose lease lapsed cannot overwrite a newer claim.
+#
+# A claim that asks for delivery writes its outbox entry in the same batch
+# as the user record, so the key is never recorded without a DM behind it.
+# Every issued key is also appended to the ledger, which keeps the history
+# the user record overwrites on the next claim, and filed in the cooldown
+# index the reminder scheduler reads.
+class DispenseEngine:
+    def __init__(self, buffer_size: int = BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._buffer = deque()
+        self._queue  = None
+        self._loop   = None
+        self._task   = None
+        self._lock   = threading.Lock()
+
+    def start(self):
+        """Start the actor on the running loop (idempotent)."""
+        with self._lock:
+            if self._task is not None and not self._task.done():
+                return
+            self._loop  = asyncio.get_running_loop()
+            self._queue = asyncio.Queue()
+            self._buffer = deque(pool.reserved())
+            self._task  = self._loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def claim(self, user_id: str, cooldown_days: int, deliver: Optional[str] = None) -> Claim:
+        """Submit a claim and wait for the actor's answer, from any thread.
+
+        `deliver` names the outbox message ("trial" or "oauth") that DMs an
+        issued key; None leaves delivery to the caller.
+        """
+        if self._task is None or self._task.done():
+            self.start()
+        if asyncio.get_running_loop() is self._loop:
+            return await self._submit(user_id, cooldown_days, deliver)
+        fut = asyncio.run_coroutine_threadsafe(
+            self._submit(user_id, cooldown_days, deliver), self._loop
+        )
+        return await asyncio.wrap_future(fut)
+
+    async def _submit(self, user_id: str, cooldown_days: int, deliver: Optional[str]) -> Claim:
+        fut = self._loop.create_future()
+        await self._queue.put((user_id, cooldown_days, deliver, fut))
+        return await fut
+
+    async def _run(self):
+        while True:
+            user_id, cooldown_days, deliver, fut = await self._queue.get()
+            try:
+                # still one claim at a time, but its storage round-trips don't block the loop
+                result = await asyncio.to_thread(self._dispense, user_id, cooldown_days, deliver)
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+            else:
+                if not fut.done():
+                    fut.set_result(result)
+
+    def _on_loop(self, fn, *args):
+        """Call `fn` on the engine's loop; claims run in a worker thread, the schedulers don't."""
+        if self._loop is None:
+            fn(*args)
+        else:
+            self._loop.call_soon_threadsafe(fn, *args)
+
+    def _next_key(self, lease: Lease) -> Optional[str]:
+        """The next buffered key, reserved against `lease` but not yet consumed."""
+        while True:
+            if not self._buffer:
+                self._buffer.extend(pool.reserve(self.buffer_size))
+                if not self._buffer:
+                    return None
+            key = self._buffer.popleft()
+            # another replica may hold the same key
+            if coord.reserve(f"key:{key}", lease):
+                return key
+
+    def _dispense(self, user_id: str, cooldown_days: int, deliver: Optional[str] = None) -> Claim:
+        lease = coord.acquire(f"claim:{user_id}")
+        if lease is None:
+            return Claim("busy", None, None)
+        try:
+            return self._dispense_locked(user_id, cooldown_days, lease, deliver)
+        finally:
+            coord.release(lease)
+
+    def _dispense_locked(self, user_id: str, cooldown_days: int, lease: Lease,
+                         deliver: Optional[str] = None) -> Claim:
+        now  = time.time()
+        user = load_user(user_id, fresh=True)
+        if user is None:
+            return Claim("unlinked", None, None)
+
+        # re-check under the claim lease so concurrent claims can't double up
+        if user.cooldown_left(cooldown_days, now):
+            return Claim("active", user.key, user)
+
+        while True:
+            key = self._next_key(lease)
+            if key is None:
+                return Claim("empty", None, user)
+            try:
+                # fencing: only the current lease holder may take the key out of the pool
+                latest = load_user(user_id, fresh=True) or user
+                if not coord.is_current(lease) or latest.claim_token > lease.token:
+                    # still reserved in the pool, so the next claim hands it out
+                    self._buffer.appendleft(key)
+                    print(f"[⚠️] Claim lease for {user_id} lapsed; key {key} withheld")
+                    return Claim("busy", None, latest)
+                if pool.consume(key):
+                    break
+                # wiped in the meantime; try the next one
+            finally:
+                coord.unreserve(f"key:{key}", lease)
+
+        previous = latest.dispensed_at  # its cooldown marker is replaced below
+        user = latest
+        user.key          = key
+        user.dispensed_at = int(now)
+        user.claim_token  = lease.token
+        writes = {
+            user_key(user_id): user.encode(),
+            marker(user_id, now): index_entry(user.dispensed_at),
+        }
+        if deliver:
+            writes[entry_key(user_id)] = new_entry(user_id, key, deliver, cooldown_days)
+        db.set_many(writes)
+        if deliver:
+            self._on_loop(outbox.schedule, user_id)
+        reminders.track(user_id, user.dispensed_at, previous)  # hands its heap update to the loop
+        ledger.append("dispense", user_id, key, token=lease.token)
+        stats.record(now)
+        return Claim("issued", key, user)
+
+
+engine = DispenseEngine()
@@ -0,0 +1,102 @@
+# dispense_stats.py
+import time
+import threading
+from storage import db
+
+STATS_KEY = "stats:dispense"       # rings saved by earlier versions, folded in once
+HOUR_FMT  = "stats:dispense:h:{}"
+DAY_FMT   = "stats:dispense:d:{}"
+HOURS     = 168  # hourly window: 7 days
+DAYS      = 30   # daily window: 30 days
+
+
+# ── Rolling dispense counters ──
+# One counter per hour and per day bucket, bumped with an atomic increment,
+# so every replica's dispenses land in the same counts. A window reads its
+# HOURS+1 / DAYS+1 buckets, sliding into the oldest one while the current
+# one is still filling. Buckets that are over are not written again, so
+# each replica reads them once and keeps them in memory; only the last two
+# of each ring (allowing for clock skew between replicas) are re-read.
+class DispenseStats:
+    def __init__(self):
+        self._closed   = {}    # bucket key -> count, for buckets that are over
+        self._pruned   = None  # hour of this replica's last prune
+        self._migrated = False
+        self._lock     = threading.Lock()
+
+    def _migrate(self):
+        """Fold the single-record rings of earlier versions into bucket counters."""
+        if self._migrated:
+            return
+        saved = db.pop(STATS_KEY)  # whoever pops it migrates it
+        for name, fmt in (("hourly", HOUR_FMT), ("daily", DAY_FMT)):
+            for bucket, count in (saved or {}).get(name) or ():
+                if bucket >= 0 and count:
+                    db.incr(fmt.format(bucket), count)
+        self._migrated = True
+
+    def _prune(self, hour: int, day: int):
+        """Drop bucket counters that have left both windows (one listing)."""
+        horizon = {"h": hour - HOURS - 1, "d": day - DAYS - 1}
+        stale = []
+        for key in db.scan("stats:dispense:"):
+            kind, bucket = key.split(":")[2:]
+            if int(bucket) < horizon[kind]:
+                stale.append(key)
+        db.delete_many(stale)
+
+    def _count(self, fmt: str, current: int, span: int, frac: float, keep: set) -> float:
+        """Events in the last `span` buckets, sliding into the oldest one by `frac`."""
+        total = 0.0
+        for bucket in range(current - span, current + 1):
+            key = fmt.format(bucket)
+            keep.add(key)
+            if key in self._closed:
+                count = self._closed[key]
+            else:
+                count = db.get(key, 0)
+                if bucket < current - 1:
+                    self._closed[key] = count
+            total += count * (1 - frac if bucket == current - span else 1)
+        return total
+
+    def record(self, ts: float = None):
+        """Count one dispense; called by the dispense engine."""
+        ts = time.time() if ts is None else ts
+        hour, day = int(ts // 3600), int(ts // 86400)
+        with self._lock:
+            self._migrate()
+            db.incr(HOUR_FMT.format(hour))
+            db.incr(DAY_FMT.format(day))
+            if self._pruned != hour:
+                self._prune(hour, day)
+                self._pruned = hour
+
+    def snapshot(self, remaining: int, ts: float = None) -> dict:
+        """1h/24h/7d/30d counts, hourly burn rate and projected pool exhaustion.
+
+        Reads storage (the whole window the first time), so callers on the
+        event loop go through asyncio.to_thread.
+        """
+        ts = time.time() if ts is None else ts
+        hour, day = ts / 3600, ts / 86400
+        keep = set()
+        with self._lock:
+            self._migrate()
+            h1  = self._count(HOUR_FMT, int(hour), 1, hour % 1, keep)
+            h24 = self._count(HOUR_FMT, int(hour), 24, hour % 1, keep)
+            d7  = self._count(HOUR_FMT, int(hour), HOURS, hour % 1, keep)
+            d30 = self._count(DAY_FMT, int(day), DAYS, day % 1, keep)
+            self._closed = {k: v for k, v in self._closed.items() if k in keep}
+        burn = h24 / 24  # keys per hour
+        return {
+            "1h": round(h1),
+            "24h": round(h24),
+            "7d": round(d7),
+            "30d": round(d30),
+            "burn_per_hour": burn,
+            "exhausts_at": ts + remaining / burn * 3600 if burn else None,
+        }
+
+
+stats = DispenseStats()
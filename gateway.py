@@ -0,0 +1,29 @@
+# gateway.py
+import os
+import discord
+
+# ── Gateway profile ──
+# The bot only answers interactions, so the lean profile (default) keeps
+# just the `guilds` intent (roles for the staff check) and caches no
+# messages or members. GATEWAY_PROFILE=full restores discord.py's defaults.
+GATEWAY_PROFILE = os.environ.get("GATEWAY_PROFILE", "lean").lower()
+SHARD_THRESHOLD = int(os.environ.get("SHARD_THRESHOLD", 1000))  # guilds before auto-sharding
+
+
+def client_options(profile: str = GATEWAY_PROFILE) -> dict:
+    if profile == "full":
+        return {"intents": discord.Intents.default()}
+    if profile != "lean":
+        raise ValueError(f"Unknown GATEWAY_PROFILE: {profile!r}")
+    return {
+        "intents": discord.Intents(guilds=True),
+        "max_messages": None,
+        "member_cache_flags": discord.MemberCacheFlags.none(),
+        "chunk_guilds_at_startup": False,
+    }
+
+
+def build_client(guild_count: int, profile: str = GATEWAY_PROFILE) -> discord.Client:
+    """A Client, or an AutoShardedClient once the bot serves SHARD_THRESHOLD guilds."""
+    cls = discord.AutoShardedClient if guild_count >= SHARD_THRESHOLD else discord.Client
+    return cls(**client_options(profile))
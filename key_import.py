@@ -0,0 +1,82 @@
+# key_import.py
+import codecs
+import asyncio
+from pool import has_key, marked_keys, push_keys
+from discord_api import get_session
+
+IMPORT_BATCH   = 5000              # keys per batched pool write
+CHUNK_SIZE     = 64 * 1024         # bytes read from an attachment at a time
+ALLOWED_SUFFIX = (".txt", ".csv")
+
+
+def _push_new(batch: list, known: set) -> tuple:
+    """Add the keys of `batch` not already in the pool; returns (added, skipped).
+
+    `known` holds every marked key; only those need their generation read,
+    since a marker left over from a wiped pool does not make a duplicate.
+    """
+    fresh = [k for k in batch if k not in known or not has_key(k)]
+    return push_keys(fresh), len(batch) - len(fresh)
+
+
+# ── Bulk key import ──
+class KeyImport:
+    """Dedups incoming keys batch by batch and writes them to the pool."""
+
+    def __init__(self, batch_size: int = IMPORT_BATCH):
+        self.batch_size = batch_size
+        self.seen    = set()  # keys of this import, for in-file duplicates
+        self.known   = None   # keys already marked in the pool, listed on first flush
+        self.pending = []
+        self.added = self.skipped = self.invalid = 0
+
+    async def feed(self, token: str):
+        k = token.strip()
+        if not k or " " in k:
+            self.invalid += 1
+        elif k in self.seen:
+            self.skipped += 1
+        else:
+            self.seen.add(k)
+            self.pending.append(k)
+            if len(self.pending) >= self.batch_size:
+                await self.flush()
+
+    async def flush(self):
+        if self.pending:
+            batch, self.pending = self.pending, []
+            # the pool listing, lookups and push_keys' queue lease stay off the event loop
+            if self.known is None:
+                self.known = await asyncio.to_thread(marked_keys)
+            added, skipped = await asyncio.to_thread(_push_new, batch, self.known)
+            self.added   += added
+            self.skipped += skipped
+
+    def summary(self) -> str:
+        msg = f"✅ Added {self.added} keys."
+        if self.skipped: msg += f" Skipped {self.skipped} duplicates."
+        if self.invalid: msg += f" Ignored {self.invalid} invalid."
+        return msg
+
+
+async def stream_tokens(url: str):
+    """Yield keys from a .txt/.csv attachment chunk by chunk, without loading it whole.
+
+    Keys may be separated by commas, newlines or both; a key split across
+    two chunks is carried over rather than cut in half.
+    """
+    async with get_session().get(url) as resp:
+        resp.raise_for_status()
+        # incremental: a character split across chunks decodes whole; drops a BOM
+        decoder = codecs.getincrementaldecoder("utf-8-sig")("ignore")
+        partial = ""
+        async for raw in resp.content.iter_chunked(CHUNK_SIZE):
+            text = partial + decoder.decode(raw)
+            *tokens, partial = text.replace("\n", ",").split(",")
+            for token in tokens:
+                # blank lines and trailing commas are not invalid keys
+                if token.strip():
+                    yield token
+        partial += decoder.decode(b"", final=True)
+        if partial.strip():
+            yield partial
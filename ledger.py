@@ -0,0 +1,323 @@
+# ledger.py
+import os
+import re
+import json
+import mmap
+import time
+import heapq
+import struct
+import asyncio
+import hashlib
+import threading
+from coordination import REPLICA_ID
+
+# ── Config ──
+# Each replica appends to its own directory; queries read the local ledger.
+LEDGER_DIR    = os.environ.get("LEDGER_DIR", os.path.join("ledger", REPLICA_ID) if REPLICA_ID else "ledger")
+SEGMENT_BYTES = 8 * 2**20    # active segment is sealed (and indexed) past this size
+COMPACT_BYTES = 64 * 2**20   # compaction merges sealed segments up to this size
+COMPACT_EVERY = 3600         # seconds between compaction passes
+EVENTS        = ("dispense", "link", "unlink", "delivery")
+
+# Index entries are big-endian so their raw bytes sort in hash order.
+ENTRY   = struct.Struct(">QII")  # field hash, record offset, record length
+FIELDS  = {"user": ".uidx", "key": ".kidx"}
+NAME_RE = re.compile(r"^(\d{8})-(\d{8})\.log$")
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def _encode(rec: dict) -> bytes:
+    return json.dumps(rec, separators=(",", ":")).encode() + b"\n"
+
+
+def _name(start: int, end: int) -> str:
+    return f"{start:08d}-{end:08d}"
+
+
+def _entries(rec: dict, offset: int, length: int):
+    for field in FIELDS:
+        if rec.get(field):
+            yield field, (_hash(rec[field]), offset, length)
+
+
+def _scan(path: str):
+    """Yield (offset, length, record) for each complete line of a segment file."""
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # torn write at the tail
+            yield offset, len(line), json.loads(line)
+            offset += len(line)
+
+
+def _write_index(path: str, entries):
+    """Write sorted ENTRY tuples to `path` atomically."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        for entry in entries:
+            f.write(ENTRY.pack(*entry))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# ── Sealed segment ──
+class Segment:
+    """An immutable segment file with memory-mapped user and key indices."""
+
+    def __init__(self, base: str, start: int, end: int):
+        self.base, self.start, self.end = base, start, end
+        self.fd   = os.open(base + ".log", os.O_RDONLY)
+        self.size = os.fstat(self.fd).st_size
+        self.maps = {field: self._map(base + ext) for field, ext in FIELDS.items()}
+
+    @staticmethod
+    def _map(path: str):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def entries(self, field: str, shift: int = 0):
+        """Every index entry in hash order, offsets moved by `shift`."""
+        mm = self.maps[field]
+        if mm is not None:
+            for h, offset, length in ENTRY.iter_unpack(mm):
+                yield h, offset + shift, length
+
+    def lookup(self, field: str, h: int) -> list:
+        """(offset, length) of every record whose `field` hashes to `h`, oldest first."""
+        mm = self.maps[field]
+        if mm is None:
+            return []
+        lo, hi = 0, len(mm) // ENTRY.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ENTRY.unpack_from(mm, mid * ENTRY.size)[0] < h:
+                lo = mid + 1
+            else:
+                hi = mid
+        found, end = [], len(mm)
+        for pos in range(lo * ENTRY.size, end, ENTRY.size):
+            eh, offset, length = ENTRY.unpack_from(mm, pos)
+            if eh != h:
+                break
+            found.append((offset, length))
+        return found
+
+    def read(self, offset: int, length: int) -> dict:
+        return json.loads(os.pread(self.fd, length, offset))
+
+    def close(self):
+        for mm in self.maps.values():
+            if mm is not None:
+                mm.close()
+        os.close(self.fd)
+
+    def remove(self):
+        self.close()
+        for ext in (".log", *FIELDS.values()):
+            os.remove(self.base + ext)
+
+
+# ── Ledger ──
+# Events are appended as JSON lines to the active segment and indexed in
+# memory. Once it passes SEGMENT_BYTES the segment is sealed: its user and
+# key indices are written as sorted (hash, offset, length) arrays that
+# queries binary-search through mmap. Compaction concatenates runs of
+# sealed segments and merges their indices, so a lookup touches a handful
+# of files no matter how many events there are.
+class Ledger:
+    def __init__(self, path: str = LEDGER_DIR):
+        self.path      = path
+        self._lock     = threading.RLock()
+        self._segments = None  # sealed, oldest first; None until opened
+        self._file     = None  # active segment, opened for append
+        self._fd       = None  # read handle on the active segment
+        self._size     = 0
+        self._index    = {}    # field -> hash -> [(offset, length)] for the active segment
+        self._start    = 0
+
+    # ── Opening & recovery ──
+    def _open(self):
+        if self._segments is not None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        found = []
+        for name in os.listdir(self.path):
+            m = NAME_RE.match(name)
+            if m:
+                found.append((int(m[1]), int(m[2])))
+        found.sort(key=lambda r: (r[0], -r[1]))
+        # a finished compaction covers its inputs; drop any it left behind
+        kept, covered_to = [], -1
+        for start, end in found:
+            base = os.path.join(self.path, _name(start, end))
+            if end <= covered_to:
+                for ext in (".log", *FIELDS.values()):
+                    if os.path.exists(base + ext):
+                        os.remove(base + ext)
+                continue
+            kept.append((start, end))
+            covered_to = end
+
+        self._segments = []
+        last = kept.pop() if kept else (0, 0)
+        for start, end in kept:
+            self._segments.append(self._seal_file(start, end))
+        base = os.path.join(self.path, _name(*last))
+        if all(os.path.exists(base + ext) for ext in FIELDS.values()):
+            # the newest segment was already sealed; start a fresh one after it
+            self._segments.append(Segment(base, *last))
+            last = (last[1] + 1, last[1] + 1)
+        self._activate(*last)
+
+    def _seal_file(self, start: int, end: int) -> Segment:
+        """Index a segment left unsealed by a crash (indices are written last)."""
+        base = os.path.join(self.path, _name(start, end))
+        if not all(os.path.exists(base + ext) for ext in FIELDS.values()):
+            per_field = {field: [] for field in FIELDS}
+            for offset, length, rec in _scan(base + ".log"):
+                for field, entry in _entries(rec, offset, length):
+                    per_field[field].append(entry)
+            for field, ext in FIELDS.items():
+                _write_index(base + ext, sorted(per_field[field]))
+        return Segment(base, start, end)
+
+    def _activate(self, start: int, end: int):
+        base = os.path.join(self.path, _name(start, end))
+        self._start = start
+        self._index = {field: {} for field in FIELDS}
+        self._size  = 0
+        if os.path.exists(base + ".log"):
+            for offset, length, rec in _scan(base + ".log"):
+                self._remember(rec, offset, length)
+                self._size = offset + length
+            os.truncate(base + ".log", self._size)  # drop a torn tail
+        self._file = open(base + ".log", "ab")
+        self._fd   = os.open(base + ".log", os.O_RDONLY)
+
+    def _remember(self, rec: dict, offset: int, length: int):
+        for field, (h, off, ln) in _entries(rec, offset, length):
+            self._index[field].setdefault(h, []).append((off, ln))
+
+    def _roll(self):
+        """Seal the active segment and start the next one."""
+        self._file.close()
+        os.close(self._fd)
+        base = os.path.join(self.path, _name(self._start, self._start))
+        for field, ext in FIELDS.items():
+            entries = sorted((h, off, ln) for h, refs in self._index[field].items() for off, ln in refs)
+            _write_index(base + ext, entries)
+        self._segments.append(Segment(base, self._start, self._start))
+        self._activate(self._start + 1, self._start + 1)
+
+    # ── Writes ──
+    def append(self, event: str, user_id, key: str = None, **detail):
+        """Record one event; never raises (the ledger is an audit trail, not a gate)."""
+        rec = {"ts": int(time.time()), "event": event, "user": str(user_id)}
+        if key:
+            rec["key"] = key
+        rec.update(detail)
+        line = _encode(rec)
+        try:
+            with self._lock:
+                self._open()
+                self._file.write(line)
+                self._file.flush()
+                self._remember(rec, self._size, len(line))
+                self._size += len(line)
+                if self._size >= SEGMENT_BYTES:
+                    self._roll()
+        except Exception as e:
+            print(f"[LEDGER ERROR] could not record {event} for {user_id}: {e!r}")
+
+    # ── Queries ──
+    def history(self, user_id, limit: int = 20) -> list:
+        """A user's events, newest first."""
+        return self._query("user", str(user_id), limit)
+
+    def whois(self, key: str, limit: int = 20) -> list:
+        """Events that mention `key`, newest first."""
+        return self._query("key", key, limit)
+
+    def _query(self, field: str, value: str, limit: int) -> list:
+        h, out = _hash(value), []
+        with self._lock:
+            self._open()
+            sources = [(lambda o, n: json.loads(os.pread(self._fd, n, o)), self._index[field].get(h, []))]
+            sources += [(seg.read, seg.lookup(field, h)) for seg in reversed(self._segments)]
+            for read, refs in sources:
+                for offset, length in reversed(refs):
+                    rec = read(offset, length)
+                    if rec.get(field) == value:  # hashes can collide
+                        out.append(rec)
+                        if len(out) >= limit:
+                            return out
+        return out
+
+    # ── Compaction ──
+    def compact(self, target: int = COMPACT_BYTES) -> int:
+        """Merge runs of small sealed segments; returns how many segments were merged away."""
+        with self._lock:
+            self._open()
+            segments = list(self._segments)
+        run, runs = [], []
+        for seg in segments:
+            if run and sum(s.size for s in run) + seg.size > target:
+                runs.append(run)
+                run = []
+            run.append(seg)
+        runs.append(run)
+
+        merged = 0
+        for run in (r for r in runs if len(r) > 1):
+            base = os.path.join(self.path, _name(run[0].start, run[-1].end))
+            shifts, offset = [], 0
+            with open(base + ".log.tmp", "wb") as out:
+                for seg in run:
+                    shifts.append(offset)
+                    with open(seg.base + ".log", "rb") as f:
+                        while chunk := f.read(2**20):
+                            out.write(chunk)
+                    offset += seg.size
+                out.flush()
+                os.fsync(out.fileno())
+            for field, ext in FIELDS.items():
+                _write_index(base + ext, heapq.merge(*(
+                    seg.entries(field, shift) for seg, shift in zip(run, shifts)
+                )))
+            # the merged log appears last: until then a crash leaves the inputs authoritative
+            os.replace(base + ".log.tmp", base + ".log")
+            new = Segment(base, run[0].start, run[-1].end)
+            with self._lock:
+                i = self._segments.index(run[0])
+                self._segments[i:i + len(run)] = [new]
+                for seg in run:
+                    seg.remove()
+            merged += len(run) - 1
+        return merged
+
+    async def run_compaction(self, every: float = COMPACT_EVERY):
+        while True:
+            await asyncio.sleep(every)
+            merged = await asyncio.to_thread(self.compact)
+            if merged:
+                print(f"[🗜️] Ledger compaction merged {merged} segments")
+
+    def close(self):
+        with self._lock:
+            if self._segments is None:
+                return
+            self._file.close()
+            os.close(self._fd)
+            for seg in self._segments:
+                seg.close()
+            self._segments = None
+
+
+ledger = Ledger()
@@ -1,50 +1,137 @@
 # log.py
 import os
+import time
+import asyncio
+from collections import Counter
 import discord
 import aiohttp
-from discord import Webhook
 from datetime import datetime, timezone
-import requests
+from metrics import WEBHOOK_SECONDS, WEBHOOK_FAILURES
 
-WEBHOOK_URLS = os.environ["LOG_WEBHOOK_URL"].split(",")
+WEBHOOK_URLS       = [u.strip() for u in os.environ["LOG_WEBHOOK_URL"].split(",") if u.strip()]
+USERNAME           = "SkySpoofer Bot"
+QUEUE_SIZE         = 1000  # pending embeds before new ones are dropped
+LOW_PRIORITY_SHARE = 0.75  # low-priority events are summarised once the queue is this full
+BATCH_SIZE         = 10    # Discord allows up to 10 embeds per webhook message
+MAX_RETRIES        = 5
 
-async def notify_staff(title: str, description: str, color):
-    """Async notification via Discord webhooks."""
-    color_value = color.value if isinstance(color, discord.Color) else int(color)
-    embed = discord.Embed(
-        title=title,
-        description=description,
-        color=color_value,
-        timestamp=datetime.now(timezone.utc)
-    )
-
-    async with aiohttp.ClientSession() as session:
-        for url in WEBHOOK_URLS:
-            url = url.strip()
-            try:
-                webhook = Webhook.from_url(url, session=session)
-                await webhook.send(embed=embed, username="SkySpoofer Bot")
-            except Exception as e:
-                # Log but don’t propagate
-                print(f"[LOG ERROR] notify_staff failed for {url}: {e}")
 
-def notify_staff_sync(title: str, description: str, color):
-    """Sync notification via HTTP POST for sync contexts."""
+def build_embed(title: str, description: str, color) -> dict:
     color_value = color.value if isinstance(color, discord.Color) else int(color)
-    embed = {
+    return {
         "title": title,
         "description": description,
         "color": color_value,
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
-    payload = {
-        "username": "SkySpoofer Bot",
-        "embeds": [embed]
-    }
 
-    for url in WEBHOOK_URLS:
-        url = url.strip()
+
+# ── Background notification service ──
+# Handlers only enqueue; one worker coalesces queued embeds into batches and
+# fans each batch out to every webhook in parallel over a long-lived session.
+# Low-priority events (rate-limit hits, bad states) are folded into one
+# "suppressed" summary once the queue is mostly full, so a flood of them
+# can't crowd out the events staff act on.
+class StaffNotifier:
+    def __init__(self, urls, maxsize: int = QUEUE_SIZE):
+        self.urls       = urls
+        self.maxsize    = maxsize
+        self.dropped    = 0  # events lost outright
+        self.aggregated = 0  # low-priority events folded into a summary
+        self._queue      = None
+        self._task       = None
+        self._session    = None
+        self._suppressed = Counter()  # title -> low-priority events not sent individually
+
+    def start(self):
+        """Start the worker on the running loop (idempotent)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._queue   = asyncio.Queue(self.maxsize)
+        from discord_api import shared_connector
+        self._session = aiohttp.ClientSession(
+            connector=shared_connector(), connector_owner=False,
+            timeout=aiohttp.ClientTimeout(total=10)
+        )
+        self._task    = asyncio.get_running_loop().create_task(self._run())
+
+    def enqueue(self, embed: dict, low_priority: bool = False) -> bool:
+        if self._task is None or self._task.done():
+            self.start()
+        if low_priority and self._queue.qsize() >= self.maxsize * LOW_PRIORITY_SHARE:
+            self._suppressed[embed["title"]] += 1
+            self.aggregated += 1
+            return False
+        try:
+            self._queue.put_nowait(embed)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._queue.qsize() if self._queue else 0,
+            "dropped": self.dropped,
+            "aggregated": self.aggregated,
+        }
+
+    async def close(self, timeout: float = 10):
+        """Flush whatever is queued, then stop the worker."""
+        if self._task is None:
+            return
         try:
-            requests.post(url, json=payload, timeout=5)
-        except Exception as e:
-            print(f"[LOG ERROR] notify_staff_sync failed for {url}: {e}")
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"[LOG ERROR] notify_staff flush timed out; {self._queue.qsize()} embeds lost")
+        self._task.cancel()
+        await self._session.close()
+        self._task = None
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < BATCH_SIZE and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            queued = len(batch)
+            if self._suppressed and len(batch) < BATCH_SIZE:
+                lines = "\n".join(f"{title} ×{n}" for title, n in self._suppressed.most_common())
+                batch.append(build_embed(
+                    "🧮 Low-priority Events Suppressed", lines, discord.Color.dark_grey()
+                ))
+                self._suppressed.clear()
+            try:
+                await asyncio.gather(*(self._post(url, batch) for url in self.urls))
+            finally:
+                for _ in range(queued):
+                    self._queue.task_done()
+
+    async def _post(self, url: str, embeds: list):
+        payload = {"username": USERNAME, "embeds": embeds}
+        start   = time.perf_counter()
+        for _ in range(MAX_RETRIES):
+            try:
+                async with self._session.post(url, json=payload) as resp:
+                    if resp.status == 429:
+                        # honour Discord's rate limit before retrying
+                        data = await resp.json(content_type=None)
+                        await asyncio.sleep(float(data.get("retry_after", 1)))
+                        continue
+                    resp.raise_for_status()
+                    WEBHOOK_SECONDS.labels("async").observe(time.perf_counter() - start)
+                    return
+            except Exception as e:
+                # Log but don’t propagate
+                WEBHOOK_FAILURES.labels("async", "error").inc()
+                print(f"[LOG ERROR] notify_staff failed for {url}: {e}")
+                return
+        WEBHOOK_FAILURES.labels("async", "rate_limited").inc()
+        print(f"[LOG ERROR] notify_staff gave up on {url} after {MAX_RETRIES} rate limits")
+
+
+notifier = StaffNotifier(WEBHOOK_URLS)
+
+
+async def notify_staff(title: str, description: str, color, low_priority: bool = False):
+    """Queue a staff notification; returns without waiting on the webhook."""
+    notifier.enqueue(build_embed(title, description, color), low_priority)
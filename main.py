@@ -1,13 +1,70 @@
 # main.py
 import os
-import threading
+import signal
+import asyncio
+import contextlib
+import discord
 import uvicorn
 from oauth_server import app
-from bot import run_bot
+from bot import bot, BOT_TOKEN
+from log import notifier
+from outbox import outbox
+from ledger import ledger
+from reminders import reminders
+import discord_api
+
+SHUTDOWN_TIMEOUT = 10  # seconds to finish in-flight requests
+
+
+class Server(uvicorn.Server):
+    """uvicorn server whose signals are handled by the runtime below."""
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+    def install_signal_handlers(self):  # uvicorn < 0.29
+        pass
+
+
+# ── Unified runtime ──
+# The bot and the OAuth server share one event loop and one connection pool,
+# so key DMs from both paths go through the bot client and its rate limiter.
+async def serve():
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    bot.http.connector = discord_api.shared_connector()
+    server = Server(uvicorn.Config(app, host="0.0.0.0", port=int(os.environ["PORT"])))
+    web    = asyncio.create_task(server.serve(), name="oauth_server")
+    gate   = asyncio.create_task(bot.start(BOT_TOKEN), name="bot")
+    signal_wait = asyncio.create_task(stop.wait())
+
+    done, _ = await asyncio.wait({web, gate, signal_wait}, return_when=asyncio.FIRST_COMPLETED)
+    for task in done - {signal_wait}:
+        if not task.cancelled() and task.exception():
+            print(f"[❌] {task.get_name()} stopped: {task.exception()!r}")
+
+    # stop taking callbacks, park DM delivery (pending entries persist and
+    # resume on the next start), flush staff logs, then drop the gateway
+    print("[👋] Shutting down…")
+    server.should_exit = True
+    _, pending = await asyncio.wait({web}, timeout=SHUTDOWN_TIMEOUT)
+    if pending:
+        server.force_exit = True
+    await outbox.stop()
+    await reminders.stop()
+    ledger.close()
+    await notifier.close()
+    await bot.close()
+    await discord_api.close_session()
+    for task in (web, gate, signal_wait):
+        task.cancel()
+    await asyncio.gather(web, gate, signal_wait, return_exceptions=True)
 
-def start_api():
-    uvicorn.run(app, host="0.0.0.0", port=int(os.environ["PORT"]))
 
 if __name__ == "__main__":
-    threading.Thread(target=start_api).start()
-    run_bot()
+    discord.utils.setup_logging()
+    asyncio.run(serve())
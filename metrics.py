@@ -0,0 +1,172 @@
+# metrics.py
+import time
+import functools
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from storage import Store
+
+# ── Prometheus metrics ──
+# Served by oauth_server at /metrics. Hot paths only pay for a timer and a
+# histogram observe; gauges such as pool size are computed at scrape time.
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+COMMAND_SECONDS = Histogram(
+    "bot_command_seconds", "Slash-command handler latency", ["command"]
+)
+COMMAND_ERRORS = Counter(
+    "bot_command_errors_total", "Slash-command handlers that raised", ["command"]
+)
+OAUTH_SECONDS = Histogram(
+    "oauth_stage_seconds", "OAuth callback latency by stage", ["stage"]
+)
+DB_SECONDS = Histogram(
+    "db_op_seconds", "Storage backend operation latency", ["op", "prefix"],
+    buckets=(.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1)
+)
+WEBHOOK_SECONDS = Histogram(
+    "webhook_send_seconds", "Staff webhook send latency", ["sender"]
+)
+WEBHOOK_FAILURES = Counter(
+    "webhook_failures_total", "Staff webhook sends that failed", ["sender", "reason"]
+)
+DM_SECONDS = Histogram(
+    "dm_delivery_seconds", "Key DM latency by step (open channel, send)", ["step"]
+)
+DM_DELIVERIES = Counter(
+    "dm_deliveries_total", "Key DM attempts by outcome", ["outcome"]
+)
+REMINDERS = Counter(
+    "cooldown_reminders_total", "Expired cooldowns by reminder outcome", ["outcome"]
+)
+OUTBOX_BACKLOG = Gauge("outbox_backlog", "Key deliveries queued in this process")
+STAFF_LOG_DEPTH = Gauge("staff_log_queue_depth", "Staff log embeds waiting to be sent")
+STAFF_LOG_DROPPED = Gauge("staff_log_dropped", "Staff log events dropped on a full queue")
+STAFF_LOG_AGGREGATED = Gauge("staff_log_aggregated", "Low-priority staff log events folded into a summary")
+POOL_SIZE = Gauge("pool_keys_available", "Keys left in the pool")
+GATEWAY_LATENCY = Gauge("discord_gateway_latency_seconds", "Discord gateway heartbeat latency")
+
+
+def render() -> bytes:
+    return generate_latest()
+
+
+# ── Decorators ──
+def timed_command(func):
+    """Time a tree.command handler under its function name."""
+    seconds = COMMAND_SECONDS.labels(func.__name__)
+    errors  = COMMAND_ERRORS.labels(func.__name__)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - start)
+    return wrapper
+
+
+def timed_stage(stage: str):
+    """Time an async OAuth step (token exchange, user fetch, ...)."""
+    seconds = OAUTH_SECONDS.labels(stage)
+
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                seconds.observe(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+# ── Storage instrumentation ──
+def _prefix(key: str) -> str:
+    if not key:
+        return "*"
+    head, sep, _ = key.partition(":")
+    return head + sep if sep else "flag"
+
+
+class InstrumentedStore(Store):
+    """Times every backend call, labelled by operation and key prefix."""
+
+    def __init__(self, backend: Store):
+        self.backend   = backend
+        self._children = {}  # (op, prefix) -> histogram child
+
+    def _observe(self, op: str, key: str, start: float):
+        child = self._children.get((op, key))
+        if child is None:
+            child = self._children[op, key] = DB_SECONDS.labels(op, key)
+        child.observe(time.perf_counter() - start)
+
+    def get(self, key, default=None):
+        start = time.perf_counter()
+        try:
+            return self.backend.get(key, default)
+        finally:
+            self._observe("get", _prefix(key), start)
+
+    def set(self, key, value):
+        start = time.perf_counter()
+        try:
+            self.backend.set(key, value)
+        finally:
+            self._observe("set", _prefix(key), start)
+
+    def delete(self, key):
+        start = time.perf_counter()
+        try:
+            return self.backend.delete(key)
+        finally:
+            self._observe("delete", _prefix(key), start)
+
+    def scan(self, prefix=""):
+        start = time.perf_counter()
+        try:
+            # materialise so the timing covers the whole listing
+            return iter(list(self.backend.scan(prefix)))
+        finally:
+            self._observe("scan", _prefix(prefix), start)
+
+    def items(self, prefix=""):
+        start = time.perf_counter()
+        try:
+            return iter(list(self.backend.items(prefix)))
+        finally:
+            self._observe("items", _prefix(prefix), start)
+
+    def pop(self, key, default=None):
+        start = time.perf_counter()
+        try:
+            return self.backend.pop(key, default)
+        finally:
+            self._observe("pop", _prefix(key), start)
+
+    def incr(self, key, delta=1):
+        start = time.perf_counter()
+        try:
+            return self.backend.incr(key, delta)
+        finally:
+            self._observe("incr", _prefix(key), start)
+
+    # batches are labelled by their first key's prefix
+    def set_many(self, items):
+        start = time.perf_counter()
+        try:
+            self.backend.set_many(items)
+        finally:
+            self._observe("set_many", _prefix(next(iter(items), "")), start)
+
+    def delete_many(self, keys):
+        keys  = list(keys)
+        start = time.perf_counter()
+        try:
+            self.backend.delete_many(keys)
+        finally:
+            self._observe("delete_many", _prefix(keys[0] if keys else ""), start)
@@ -1,130 +1,137 @@
 # oauth_server.py
 import os
-import requests
+import time
+import asyncio
 import discord
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import RedirectResponse
-from replit import db
-from datetime import datetime, timezone
-from log import notify_staff_sync
+from fastapi.responses import RedirectResponse, Response
+from storage import db
+from log import notifier, notify_staff
+from pool import ensure_index, pool_size
+from dispense import engine
+from records import UserRecord, load_user, save_user, user_key
+from ledger import ledger
+from ratelimit import SlidingWindowLimiter
+from states import consume_state
+import discord_api
+import metrics
+from outbox import outbox
 
 app = FastAPI()
 
 # ── Config ──
-CLIENT_ID     = os.environ["CLIENT_ID"]
-CLIENT_SECRET = os.environ["CLIENT_SECRET"]
-BOT_TOKEN     = os.environ["BOT_TOKEN"]
-REDIRECT_URI  = os.environ["REDIRECT_URI"]
 WEBHOOK_URL   = os.environ["LOG_WEBHOOK_URL"]
 
 # ── IP Rate-Limit Store ──
-ip_requests = {}
-RATE_LIMIT  = 5    # calls
-RATE_PERIOD = 60   # seconds
+RATE_LIMIT      = 5    # calls
+RATE_PERIOD     = 60   # seconds
+MAX_TRACKED_IPS = int(os.environ.get("MAX_TRACKED_IPS", 100_000))
+# Only honour X-Forwarded-For when the direct peer is one of these proxies
+TRUSTED_PROXIES = {p.strip() for p in os.environ.get("TRUSTED_PROXIES", "").split(",") if p.strip()}
+
+ip_limiter = SlidingWindowLimiter(RATE_LIMIT, RATE_PERIOD, MAX_TRACKED_IPS)
+
+# read only when /metrics is scraped
+metrics.POOL_SIZE.set_function(pool_size)
+metrics.OUTBOX_BACKLOG.set_function(outbox.backlog)
+metrics.STAFF_LOG_DEPTH.set_function(lambda: notifier.stats()["depth"])
+metrics.STAFF_LOG_DROPPED.set_function(lambda: notifier.dropped)
+metrics.STAFF_LOG_AGGREGATED.set_function(lambda: notifier.aggregated)
+
+def client_ip(request: Request) -> str:
+    """Peer address, or the first untrusted hop of X-Forwarded-For behind a trusted proxy."""
+    ip = request.client.host
+    if ip not in TRUSTED_PROXIES:
+        return ip
+    forwarded = request.headers.get("x-forwarded-for", "")
+    for hop in reversed([h.strip() for h in forwarded.split(",") if h.strip()]):
+        if hop not in TRUSTED_PROXIES:
+            return hop
+    return ip
 
 def record_ip(ip: str) -> bool:
     """Return True if rate limit exceeded."""
-    now = datetime.now(timezone.utc)
-    lst = ip_requests.get(ip, [])
-    # keep only recent
-    lst = [t for t in lst if (now - t).total_seconds() < RATE_PERIOD]
-    lst.append(now)
-    ip_requests[ip] = lst
-    return len(lst) > RATE_LIMIT
+    return ip_limiter.hit(ip)
+
+@app.on_event("startup")
+async def on_startup():
+    await asyncio.to_thread(ensure_index)  # takes the queue lease
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/oauth/callback")
+@metrics.timed_stage("total")
 async def oauth_callback(request: Request):
-    ip = request.client.host
+    ip = client_ip(request)
     if record_ip(ip):
-        notify_staff_sync(
+        await notify_staff(
             "🚫 Rate Limit Exceeded",
             f"IP {ip} exceeded OAuth callback rate limit.",
-            discord.Color.red()
+            discord.Color.red(),
+            low_priority=True
         )
         raise HTTPException(429, "Too many requests")
 
     code  = request.query_params.get("code")
     state = request.query_params.get("state")
     if not code or not state:
-        notify_staff_sync(
+        await notify_staff(
             "⚠️ Invalid OAuth State",
             f"Missing code or state. ip={ip}",
-            discord.Color.orange()
+            discord.Color.orange(),
+            low_priority=True
         )
         raise HTTPException(400, "Missing code or state")
 
-    state_key = f"state:{state}"
-    if state_key not in db:
-        notify_staff_sync(
+    rec = consume_state(state)
+    if rec is None:
+        await notify_staff(
             "⚠️ Invalid OAuth State",
             f"State not found or expired: {state} (ip={ip})",
-            discord.Color.orange()
+            discord.Color.orange(),
+            low_priority=True
         )
         raise HTTPException(400, "Invalid state")
 
-    rec = db[state_key]
     discord_id = rec["user_id"]
-    user_db_key = f"user:{discord_id}"
-    now = datetime.now(timezone.utc)
 
     # Persist link record (first-time only)
-    if user_db_key in db:
-        notify_staff_sync(
+    if user_key(discord_id) in db:
+        await notify_staff(
             "🚫 Duplicate OAuth Attempt",
             f"<@{discord_id}> tried to re-link.",
-            discord.Color.red()
+            discord.Color.red(),
+            low_priority=True
         )
     else:
-        db[user_db_key] = {
-            "discord_id": discord_id,
-            "email": None,               # placeholder until fetched
-            "first_linked_at": now.isoformat()
-        }
+        # email stays empty until fetched below
+        save_user(UserRecord(discord_id, linked_at=int(time.time())))
+        ledger.append("link", discord_id)
 
-    # purge the OAuth state immediately
-    del db[state_key]
-
-    # Exchange code → token & fetch email
+    # Exchange code → token, then fetch the user
     try:
-        token_resp = requests.post(
-            "https://discord.com/api/oauth2/token",
-            data={
-                "client_id": CLIENT_ID,
-                "client_secret": CLIENT_SECRET,
-                "grant_type": "authorization_code",
-                "code": code,
-                "redirect_uri": REDIRECT_URI,
-                "scope": "identify email"
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"}
-        )
-        token_resp.raise_for_status()
-        access_token = token_resp.json()["access_token"]
-
-        user_resp = requests.get(
-            "https://discord.com/api/users/@me",
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
-        user_resp.raise_for_status()
-        user_data = user_resp.json()
+        access_token = await discord_api.exchange_code(code)
+        user_data    = await discord_api.fetch_user(access_token)
         email = user_data.get("email")
         if not email:
             raise Exception("Email scope missing")
 
         # update email in user record
-        rec = db[user_db_key]
-        rec["email"] = email
-        db[user_db_key] = rec
+        user = load_user(discord_id, fresh=True)
+        user.email = email
+        save_user(user)
 
         # log successful link
-        notify_staff_sync(
+        await notify_staff(
             "🔗 Discord Linked",
             f"<@{discord_id}> linked ({email}).",
             discord.Color.green()
         )
 
     except Exception as e:
-        notify_staff_sync(
+        await notify_staff(
             "🔥 Bot Error",
             f"OAuth token/user fetch error for <@{discord_id}>: {e}",
             discord.Color.red()
@@ -132,80 +139,16 @@ async def oauth_callback(request: Request):
         raise HTTPException(500, "OAuth failure")
 
     # ── Auto-dispense first key and JIT remove from pool ──
-    for k, v in list(db.items()):
-        if k.startswith("key:"):
-            key_str = k.split("key:")[1]
-
-            # remove from pool
-            del db[k]
-
-            # annotate user record
-            rec = db[user_db_key]
-            rec["dispensed_key"]     = key_str
-            rec["last_dispensed_at"] = now.isoformat()
-            db[user_db_key] = rec
-
-            # DM via Discord API with an embed
-            try:
-                # 1) open a DM channel
-                dm = requests.post(
-                    "https://discord.com/api/v10/users/@me/channels",
-                    headers={
-                        "Authorization": f"Bot {BOT_TOKEN}",
-                        "Content-Type": "application/json"
-                    },
-                    json={"recipient_id": discord_id}
-                )
-                dm.raise_for_status()
-                cid = dm.json()["id"]
-
-                # 2) build the embed payload
-                embed = {
-                    "title": "🎉 Your SkySpoofer Trial Key",
-                    "description": (
-                        f"**Key:** ```{key_str}```\n"
-                        "**To Use:**\n"
-                        "- Make an account [here](https://skyspoofer.com/register)\n"
-                        "- Activate the key in the license tab on the dashboard.\n"
-                        "- Download the software, unzip it, and run SkySpoofer.exe.\n"
-                        "- After you get the message `Authentication successful!`, press connect loader in the hardware tab.\n"
-                        "- Your serials will be scanned, and you may press apply changes.\n"
-                        "- *Do not spoof any module you do not have or have disabled*\n\n"
-                        "**Note:** This is a **temporary trial key** to showcase the software’s functionality before purchase."
-                        " It is not intended for removing a hardware unban, purchase a license if you wish to do so.\n"
-                        "With the trial license, serials reset on shutdown and it **won’t** bypass advanced anti-cheats like Vanguard.\n\n"
-                        "To purchase a key with advanced anti-cheat bypass, visit [SkySpoofer Pricing](https://skyspoofer.com/#pricing).\n\n"
-                        "You may claim another free trial in 30 days."
-                    ),
-                    "color": discord.Color.blurple().value,
-                    "timestamp": now.isoformat()
-                }
-
-
-                # 3) send the embed
-                requests.post(
-                    f"https://discord.com/api/v10/channels/{cid}/messages",
-                    headers={
-                        "Authorization": f"Bot {BOT_TOKEN}",
-                        "Content-Type": "application/json"
-                    },
-                    json={"embeds": [embed]}
-                )
-
-            except Exception as e:
-                notify_staff_sync(
-                    "📭 DM Delivery Failed",
-                    f"Could not DM <@{discord_id}> **{key_str}**: {e}",
-                    discord.Color.orange()
-                )
-
-
-            # log dispense
-            notify_staff_sync(
-                "🔑 Key Dispensed",
-                f"<@{discord_id}> was issued **{key_str}**.",
-                discord.Color.green()
-            )
-            break
+    # the embed DM goes out through the delivery outbox
+    claim = await engine.claim(discord_id, db.get("config:cooldown_days", 30), deliver="oauth")
+    if claim.status == "issued":
+        key_str = claim.key
+
+        # log dispense
+        await notify_staff(
+            "🔑 Key Dispensed",
+            f"<@{discord_id}> was issued **{key_str}**.",
+            discord.Color.green()
+        )
 
     return RedirectResponse("https://skyspoofer.com")
@@ -0,0 +1,281 @@
+# outbox.py
+import os
+import time
+import heapq
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
+import discord
+from storage import db
+from coordination import coord
+from records import load_user
+from ledger import ledger
+from log import notify_staff
+from metrics import DM_SECONDS, DM_DELIVERIES
+
+# ── Config ──
+OUTBOX_WORKERS = int(os.environ.get("OUTBOX_WORKERS", 4))  # concurrent DM senders
+MAX_ATTEMPTS   = 8     # transient failures before an entry is parked as "failed"
+BACKOFF_BASE   = 5     # seconds, doubled after every failed attempt
+BACKOFF_CAP    = 1800  # seconds
+CHANNEL_GAP    = 1.0   # minimum seconds between two sends to one DM channel
+CHANNEL_SWEEP  = 1000  # tracked DM channels before those past their gap are dropped
+SEND_LEASE_TTL = 60    # seconds one replica may hold a delivery
+COUNT_EVERY    = 60    # seconds between recounts of stored entries for /status
+
+
+def entry_key(user_id: str) -> str:
+    return f"outbox:{user_id}"
+
+
+def new_entry(user_id: str, key: str, message: str, cooldown_days: int) -> dict:
+    """A pending delivery of `key`; `message` picks the template ("trial" or "oauth")."""
+    now = time.time()
+    return {
+        "user_id": user_id,
+        "key": key,
+        "message": message,
+        "cooldown_days": cooldown_days,
+        "state": "pending",  # "pending" | "blocked" (DMs closed) | "failed"
+        "attempts": 0,
+        "next_at": now,
+        "created_at": now,
+        "error": None,
+    }
+
+
+# ── Messages ──
+def trial_embed(key_str: str, now: datetime) -> dict:
+    return {
+        "title": "🎉 Your SkySpoofer Trial Key",
+        "description": (
+            f"**Key:** ```{key_str}```\n"
+            "**To Use:**\n"
+            "- Make an account [here](https://skyspoofer.com/register)\n"
+            "- Activate the key in the license tab on the dashboard.\n"
+            "- Download the software, unzip it, and run SkySpoofer.exe.\n"
+            "- After you get the message `Authentication successful!`, press connect loader in the hardware tab.\n"
+            "- Your serials will be scanned, and you may press apply changes.\n"
+            "- *Do not spoof any module you do not have or have disabled*\n\n"
+            "**Note:** This is a **temporary trial key** to showcase the software’s functionality before purchase."
+            " It is not intended for removing a hardware unban, purchase a license if you wish to do so.\n"
+            "With the trial license, serials reset on shutdown and it **won’t** bypass advanced anti-cheats like Vanguard.\n\n"
+            "To purchase a key with advanced anti-cheat bypass, visit [SkySpoofer Pricing](https://skyspoofer.com/#pricing).\n\n"
+            "You may claim another free trial in 30 days."
+        ),
+        "color": discord.Color.blurple().value,
+        "timestamp": now.isoformat()
+    }
+
+
+def render(entry: dict) -> dict:
+    """Keyword arguments for channel.send()."""
+    if entry["message"] == "oauth":
+        issued = datetime.fromtimestamp(entry["created_at"], timezone.utc)
+        return {"embed": discord.Embed.from_dict(trial_embed(entry["key"], issued))}
+    return {
+        "content": f"🎉 Here’s your trial key:\n**{entry['key']}**\n"
+                   f"Next in {entry['cooldown_days']} days."
+    }
+
+
+# ── Delivery outbox ──
+# The dispense engine writes the outbox entry in the same batch as the
+# user record, so an issued key always has a durable delivery behind it.
+# A scheduler moves due entries onto a queue drained by a few workers;
+# transient errors back off exponentially, Discord rate limits are waited
+# out per DM channel, and users with closed DMs are parked as "blocked"
+# until they press "Retry delivery" or staff run /resend_key.
+class Outbox:
+    def __init__(self, workers: int = OUTBOX_WORKERS):
+        self.workers   = workers
+        self.client    = None
+        self._due      = []     # heap of (next_at, user_id)
+        self._ready    = None   # asyncio.Queue of due user_ids
+        self._wake     = None
+        self._tasks    = []
+        self._inflight = set()
+        self._channels = {}     # DM channel id -> earliest time of the next send
+        self._sweep_at = CHANNEL_SWEEP
+        self._counts   = Counter()
+
+    def start(self, client: discord.Client):
+        """Start the scheduler and workers on the running loop (idempotent)."""
+        if self._tasks and not all(t.done() for t in self._tasks):
+            return
+        self.client = client
+        self._ready = asyncio.Queue()
+        self._wake  = asyncio.Event()
+        # resume whatever a previous process left pending
+        for _, entry in db.items("outbox:"):
+            if entry.get("state") == "pending":
+                heapq.heappush(self._due, (entry["next_at"], entry["user_id"]))
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._schedule())]
+        self._tasks += [loop.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(loop.create_task(self._recount()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def schedule(self, user_id: str, at: Optional[float] = None):
+        """Queue a delivery attempt for `user_id` at `at` (default: now)."""
+        heapq.heappush(self._due, (time.time() if at is None else at, user_id))
+        if self._wake is not None:
+            self._wake.set()
+
+    def redeliver(self, user_id: str, cooldown_days: int) -> Optional[str]:
+        """Re-queue the user's current key right away; returns it, or None if there is none."""
+        entry = db.get_fresh(entry_key(user_id))
+        if entry is None:
+            user = load_user(user_id, fresh=True)
+            if user is None or user.key is None:
+                return None
+            entry = new_entry(user_id, user.key, "trial", cooldown_days)
+        else:
+            entry.update(state="pending", attempts=0, next_at=time.time(), error=None)
+        db[entry_key(user_id)] = entry
+        self.schedule(user_id, entry["next_at"])
+        return entry["key"]
+
+    def backlog(self) -> int:
+        """Deliveries queued in this process (read by /metrics)."""
+        return len(self._due) + (self._ready.qsize() if self._ready else 0)
+
+    def counts(self) -> Counter:
+        """Stored entries by state as of the last recount (used by /status)."""
+        return self._counts
+
+    def _count_entries(self) -> Counter:
+        return Counter(entry["state"] for _, entry in db.items("outbox:"))
+
+    async def _recount(self, every: float = COUNT_EVERY):
+        # blocked and failed entries stay until resolved, so the scan grows
+        # with them; it runs here, off the loop, never inside /status
+        while True:
+            try:
+                self._counts = await asyncio.to_thread(self._count_entries)
+            except Exception as e:
+                print(f"[OUTBOX ERROR] recount failed: {e!r}")
+            await asyncio.sleep(every)
+
+    async def _schedule(self):
+        while True:
+            self._wake.clear()
+            now = time.time()
+            while self._due and self._due[0][0] <= now:
+                self._ready.put_nowait(heapq.heappop(self._due)[1])
+            timeout = self._due[0][0] - now if self._due else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _work(self):
+        while True:
+            user_id = await self._ready.get()
+            if user_id in self._inflight:
+                # a send for this user is under way; look again shortly
+                self.schedule(user_id, time.time() + CHANNEL_GAP)
+                continue
+            self._inflight.add(user_id)
+            try:
+                await self._deliver(user_id)
+            except Exception as e:
+                print(f"[OUTBOX ERROR] delivery to {user_id} crashed: {e!r}")
+            finally:
+                self._inflight.discard(user_id)
+
+    async def _deliver(self, user_id: str):
+        entry = db.get_fresh(entry_key(user_id))
+        if entry is None or entry["state"] != "pending":
+            return
+        if entry["next_at"] > time.time():
+            return  # rescheduled since this attempt was queued
+
+        # another replica may be sending the same entry
+        lease = coord.acquire(f"dm:{user_id}", SEND_LEASE_TTL)
+        if lease is None:
+            return self.schedule(user_id, time.time() + SEND_LEASE_TTL)
+        channel = None
+        try:
+            start   = time.perf_counter()
+            channel = await self.client.create_dm(discord.Object(id=int(user_id)))
+            DM_SECONDS.labels("open").observe(time.perf_counter() - start)
+
+            wait = self._channels.get(channel.id, 0) - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            start = time.perf_counter()
+            await channel.send(**render(entry))
+            DM_SECONDS.labels("send").observe(time.perf_counter() - start)
+        except discord.Forbidden as e:
+            await self._park(entry, "blocked", e)
+        except discord.RateLimited as e:
+            self._retry(entry, e, e.retry_after, channel)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                retry_after = float(e.response.headers.get("Retry-After", BACKOFF_BASE))
+                self._retry(entry, e, retry_after, channel)
+            else:
+                await self._backoff(entry, e)
+        except Exception as e:
+            await self._backoff(entry, e)
+        else:
+            self._hold(channel.id, time.time() + CHANNEL_GAP)
+            current = db.get_fresh(entry_key(user_id))
+            if current is not None and current["key"] == entry["key"]:
+                del db[entry_key(user_id)]
+            DM_DELIVERIES.labels("delivered").inc()
+            ledger.append("delivery", user_id, entry["key"], status="delivered", attempts=entry["attempts"] + 1)
+        finally:
+            coord.release(lease)
+
+    def _hold(self, channel_id: int, until: float):
+        """No sends to `channel_id` before `until`; channels past their gap are forgotten."""
+        if len(self._channels) >= self._sweep_at:
+            now = time.time()
+            self._channels = {c: t for c, t in self._channels.items() if t > now}
+            # amortised: sweep again once the live set has doubled
+            self._sweep_at = max(CHANNEL_SWEEP, 2 * len(self._channels))
+        self._channels[channel_id] = until
+
+    def _retry(self, entry: dict, error: Exception, delay: float, channel=None):
+        """Rate limited: try again after `delay` without spending an attempt."""
+        if channel is not None:
+            self._hold(channel.id, time.time() + delay)
+        entry.update(next_at=time.time() + delay, error=str(error)[:200])
+        db[entry_key(entry["user_id"])] = entry
+        self.schedule(entry["user_id"], entry["next_at"])
+        DM_DELIVERIES.labels("rate_limited").inc()
+
+    async def _backoff(self, entry: dict, error: Exception):
+        """Transient failure: retry with exponential backoff, or park it for good."""
+        entry["attempts"] += 1
+        if entry["attempts"] >= MAX_ATTEMPTS:
+            return await self._park(entry, "failed", error)
+        delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (entry["attempts"] - 1))
+        entry.update(next_at=time.time() + delay, error=str(error)[:200])
+        db[entry_key(entry["user_id"])] = entry
+        self.schedule(entry["user_id"], entry["next_at"])
+        DM_DELIVERIES.labels("retry").inc()
+
+    async def _park(self, entry: dict, state: str, error: Exception):
+        entry.update(state=state, error=str(error)[:200])
+        db[entry_key(entry["user_id"])] = entry
+        DM_DELIVERIES.labels(state).inc()
+        ledger.append("delivery", entry["user_id"], entry["key"], status=state, error=entry["error"])
+        reason = "DMs are closed" if state == "blocked" else f"gave up after {entry['attempts']} attempts"
+        await notify_staff(
+            "📭 DM Delivery Failed",
+            f"Could not DM <@{entry['user_id']}> **{entry['key']}** ({reason}): {error}\n"
+            f"The key is kept; use `/resend_key` once resolved.",
+            discord.Color.orange()
+        )
+
+
+outbox = Outbox()
@@ -0,0 +1,242 @@
+# pool.py
+import asyncio
+from storage import db
+from coordination import coord, REPLICA_ID
+
+# ── Key-Pool Index ──
+# Available keys live as `key:{k}` markers (for dedup) plus a FIFO of
+# numbered slots `pool:{gen}:slot:{n}` between the generation's head and
+# tail. `pool:{gen}:count` tracks how many keys are still available, so
+# counting and popping never have to list the whole database.
+#
+# Everything is namespaced by `pool:gen`: a marker only counts if its value
+# is the current generation, so wiping the pool is a single generation bump
+# and retired generations are garbage-collected lazily in the background.
+#
+# Moving the queue's head or tail, or bumping the generation, happens under
+# the `pool:queue` lease so replicas never hand out the same slot range;
+# counters change through atomic increments.
+GEN_KEY      = "pool:gen"
+GC_FLOOR_KEY = "pool:gc_floor"  # oldest generation not yet collected
+GC_BATCH     = 500              # slots per GC step
+QUEUE_LEASE  = "pool:queue"
+RESERVED     = f"reserved:{REPLICA_ID}" if REPLICA_ID else "reserved"  # this replica's list
+
+
+def _gen(fresh: bool = False) -> int:
+    # writers read it fresh: another replica may have bumped it since we cached it
+    return (db.get_fresh if fresh else db.get)(GEN_KEY, 0)
+
+
+def _k(gen: int, name: str) -> str:
+    return f"pool:{gen}:{name}"
+
+
+def _slot(gen: int, n: int) -> str:
+    return f"pool:{gen}:slot:{n}"
+
+
+def _live(key, gen: int) -> bool:
+    return key is not None and db.get(f"key:{key}") == gen
+
+
+def pool_size() -> int:
+    """Number of keys still available in the pool."""
+    return db.get(_k(_gen(), "count"), 0)
+
+
+def has_key(key: str) -> bool:
+    return _live(key, _gen())
+
+
+def marked_keys() -> set:
+    """Every key with a `key:*` marker, of any generation, from one listing."""
+    return {k[len("key:"):] for k in db.scan("key:")}
+
+
+def push_keys(keys) -> int:
+    """Append new keys to the tail of the pool; returns how many were added."""
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return 0
+    with coord.hold(QUEUE_LEASE):
+        gen  = _gen(fresh=True)
+        tail = db.get(_k(gen, "tail"), 0)
+        batch = {_slot(gen, n): key for n, key in enumerate(keys, start=tail)}
+        batch.update({f"key:{key}": gen for key in keys})
+        batch[_k(gen, "tail")] = tail + len(keys)
+        db.set_many(batch)
+    db.incr(_k(gen, "count"), len(keys))
+    return len(keys)
+
+
+# ── Reservations (dispense engine buffer) ──
+# Reserved keys have left the slot queue but still count as available until
+# consumed, and are persisted so a restart hands them out first.
+def reserved(gen: int = None) -> list:
+    return list(db.get(_k(_gen() if gen is None else gen, RESERVED), []))
+
+
+def reserve(n: int) -> list:
+    """Move up to `n` keys from the head of the queue into the reserved list."""
+    with coord.hold(QUEUE_LEASE) as lease:
+        gen  = _gen(fresh=True)
+        head = start = db.get(_k(gen, "head"), 0)
+        tail = db.get(_k(gen, "tail"), 0)
+        taken, slots = [], []
+        while head < tail and len(taken) < n:
+            slot = _slot(gen, head)
+            key  = db.get(slot)
+            head += 1
+            slots.append(slot)
+            if _live(key, gen):
+                taken.append(key)
+        if head == start:
+            return []
+        # fencing: a lapsed lease must not move the head back over a newer holder's;
+        # nothing has been removed yet, so the slots stay reachable for the next holder
+        if not coord.is_current(lease):
+            return []
+        db.set_many({_k(gen, RESERVED): reserved(gen) + taken, _k(gen, "head"): head})
+        # slots behind the head are never read again; a crash here only leaves a few dead ones
+        db.delete_many(slots)
+    return taken
+
+
+def consume(key: str) -> bool:
+    """Finalise a reserved key; False if it was wiped in the meantime."""
+    gen  = _gen(fresh=True)
+    held = reserved(gen)
+    if key not in held:
+        # reserved under a generation that has since been wiped
+        return False
+    held.remove(key)
+    db[_k(gen, RESERVED)] = held
+    if not _live(key, gen) or not db.delete(f"key:{key}"):
+        return False
+    db.incr(_k(gen, "count"), -1)
+    return True
+
+
+def iter_keys():
+    """Yield available keys in dispense order."""
+    gen = _gen()
+    for key in reserved():
+        if _live(key, gen):
+            yield key
+    head = db.get(_k(gen, "head"), 0)
+    tail = db.get(_k(gen, "tail"), 0)
+    for n in range(head, tail):
+        key = db.get(_slot(gen, n))
+        if _live(key, gen):
+            yield key
+
+
+def page(cursor: int = None, size: int = 25):
+    """One page of available keys starting at slot `cursor` (None = first page).
+
+    Returns (keys, next_cursor); next_cursor is None on the last page. Reads
+    at most a few pages' worth of slots, however large the pool is.
+    """
+    gen  = _gen()
+    head = db.get(_k(gen, "head"), 0)
+    tail = db.get(_k(gen, "tail"), 0)
+    keys = []
+    if cursor is None:
+        keys = [k for k in reserved() if _live(k, gen)]
+    n     = max(cursor or 0, head)
+    limit = n + size * 4  # bound the reads spent skipping stale slots
+    while n < tail and n < limit and len(keys) < size:
+        key = db.get(_slot(gen, n))
+        n  += 1
+        if _live(key, gen):
+            keys.append(key)
+    return keys, (n if n < tail else None)
+
+
+def export_keys(fp, chunk: int = 1000) -> int:
+    """Write every available key to a text file, one per line, in chunks."""
+    count, lines = 0, []
+    for key in iter_keys():
+        lines.append(key)
+        if len(lines) >= chunk:
+            fp.write("\n".join(lines) + "\n")
+            count += len(lines)
+            lines = []
+    if lines:
+        fp.write("\n".join(lines) + "\n")
+        count += len(lines)
+    return count
+
+
+def clear_pool() -> int:
+    """Wipe every available key with one generation bump; returns how many."""
+    with coord.hold(QUEUE_LEASE):
+        gen   = _gen(fresh=True)
+        count = db.get(_k(gen, "count"), 0)
+        db[GEN_KEY] = gen + 1
+    return count
+
+
+# ── Garbage collection of retired generations ──
+def gc_step(batch: int = GC_BATCH) -> int:
+    """Delete up to `batch` slots (and their markers) of the oldest retired generation."""
+    gen = _gen()
+    old = db.get(GC_FLOOR_KEY, 0)
+    if old >= gen:
+        return 0
+
+    cursor = db.get(_k(old, "gc"), db.get(_k(old, "head"), 0))
+    tail   = db.get(_k(old, "tail"), 0)
+    end    = min(cursor + batch, tail)
+    doomed = []
+    for n in range(cursor, end):
+        key = db.get(_slot(old, n))
+        doomed.append(_slot(old, n))
+        if _live(key, old):
+            doomed.append(f"key:{key}")
+
+    if end >= tail:
+        # generation fully collected: drop its bookkeeping and move on
+        for name, held in db.items(_k(old, "reserved")):
+            doomed += [f"key:{k}" for k in held if _live(k, old)] + [name]
+        doomed += [_k(old, name) for name in ("head", "tail", "count", "gc")]
+        db.delete_many(doomed)
+        db[GC_FLOOR_KEY] = old + 1
+    else:
+        db.delete_many(doomed)
+        db[_k(old, "gc")] = end
+    return max(len(doomed), 1)
+
+
+async def run_gc(pause: float = 0.05):
+    """Collect retired generations in small steps without hogging the loop."""
+    while await asyncio.to_thread(gc_step):
+        await asyncio.sleep(pause)
+
+
+# ── Migration ──
+def rebuild_index() -> int:
+    """Start a fresh generation holding every existing `key:*` entry."""
+    old   = db.get(GEN_KEY)
+    gen   = 1 if old is None else old + 1
+    keys  = [k[len("key:"):] for k, v in db.items("key:") if old is None or v == old]
+    batch = {_slot(gen, n): key for n, key in enumerate(keys)}
+    batch.update({f"key:{key}": gen for key in keys})
+    batch.update({_k(gen, "tail"): len(keys), _k(gen, "count"): len(keys), GEN_KEY: gen})
+    if old is None:
+        # drop the pre-generation index (pool:head, pool:slot:*, ...)
+        db.delete_many([k for k in db.scan("pool:") if not k.split(":")[1].isdigit()])
+        batch[GC_FLOOR_KEY] = gen
+    db.set_many(batch)
+    return len(keys)
+
+
+def ensure_index() -> None:
+    """Build the index once for databases created before it existed."""
+    if GEN_KEY in db:
+        return
+    with coord.hold(QUEUE_LEASE):
+        if db.get_fresh(GEN_KEY) is None:
+            n = rebuild_index()
+            print(f"[🔧] Pool index rebuilt from {n} existing keys")
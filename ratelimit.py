@@ -0,0 +1,90 @@
+# ratelimit.py
+import time
+from collections import OrderedDict
+
+
+# ── Per-user token bucket ──
+class TokenBucketLimiter:
+    """In-process token buckets keyed by an ID (e.g. Discord user ID).
+
+    Each key holds `burst` tokens refilled at `rate` tokens/second. A bucket
+    that has been idle long enough to refill completely is indistinguishable
+    from a new one, so it is evicted; `max_keys` caps memory regardless.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, max_keys: int = 100_000):
+        self.rate     = rate
+        self.burst    = burst
+        self.max_keys = max_keys
+        self.idle     = burst / rate  # seconds until a bucket is full again
+        self._buckets = OrderedDict()  # key -> (tokens, last_seen), oldest first
+
+    def hit(self, key, now: float = None) -> float:
+        """Take one token; returns 0 if allowed, else seconds until allowed."""
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+
+        tokens, last = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (1 - tokens) / self.rate
+
+    def _evict(self, now: float):
+        # entries are ordered by last hit, so idle ones sit at the front
+        buckets = self._buckets
+        while buckets:
+            key, (_, last) = next(iter(buckets.items()))
+            if now - last < self.idle and len(buckets) < self.max_keys:
+                break
+            buckets.popitem(last=False)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# ── Per-IP sliding-window counter ──
+class SlidingWindowLimiter:
+    """Fixed-memory sliding-window rate limit keyed by IP address.
+
+    Each IP keeps only (window_start, previous_count, current_count); the
+    previous window's count is weighted by how much of it still overlaps the
+    sliding window. Idle IPs are evicted and at most `max_keys` are tracked.
+    """
+
+    def __init__(self, limit: int, period: float, max_keys: int = 100_000):
+        self.limit    = limit
+        self.period   = period
+        self.max_keys = max_keys
+        self._windows = OrderedDict()  # key -> (window_start, prev, curr), oldest first
+
+    def hit(self, key, now: float = None) -> bool:
+        """Record a request; returns True if the limit is exceeded."""
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+
+        start, prev, curr = self._windows.pop(key, (now, 0, 0))
+        elapsed = now - start
+        if elapsed >= 2 * self.period:
+            start, prev, curr = now, 0, 0
+        elif elapsed >= self.period:
+            start, prev, curr = start + self.period, curr, 0
+        curr += 1
+        self._windows[key] = (start, prev, curr)
+
+        weight = 1 - (now - start) / self.period
+        return prev * weight + curr > self.limit
+
+    def _evict(self, now: float):
+        # ordered by last hit: anything idle for two windows carries no state
+        windows = self._windows
+        while windows:
+            key, (start, _, _) = next(iter(windows.items()))
+            if now - start < 2 * self.period and len(windows) < self.max_keys:
+                break
+            windows.popitem(last=False)
+
+    def __len__(self):
+        return len(self._windows)
@@ -0,0 +1,126 @@
+# records.py
+import time
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from storage import db
+
+# ── Record schema ──
+# User records are stored as a positional list headed by a schema version:
+#   [version, discord_id, email, linked_at, key, dispensed_at, claim_token]
+# with timestamps in epoch seconds. Older records (free-form dicts with
+# ISO-8601 strings) are converted on first read and written back; the
+# bulk migration below converts the rest in one pass.
+RECORD_VERSION  = 1
+USER_PREFIX     = "user:"
+MIGRATION_FLAG  = "migrated:records"
+MIGRATION_BATCH = 500
+
+
+@dataclass(slots=True)
+class UserRecord:
+    discord_id: str
+    email: Optional[str] = None
+    linked_at: Optional[int] = None     # epoch seconds
+    key: Optional[str] = None           # last dispensed key
+    dispensed_at: Optional[int] = None  # epoch seconds
+    claim_token: int = 0                # fencing token of the claim that set `key`
+
+    def encode(self) -> list:
+        return [
+            RECORD_VERSION, self.discord_id, self.email, self.linked_at,
+            self.key, self.dispensed_at, self.claim_token,
+        ]
+
+    @classmethod
+    def decode(cls, raw) -> "UserRecord":
+        if isinstance(raw, dict):
+            return cls.from_legacy(raw)
+        if raw[0] != RECORD_VERSION:
+            raise ValueError(f"Unknown user record version: {raw[0]!r}")
+        return cls(*raw[1:])
+
+    @classmethod
+    def from_legacy(cls, rec: dict) -> "UserRecord":
+        return cls(
+            discord_id=str(rec["discord_id"]),
+            email=rec.get("email"),
+            linked_at=_epoch(rec.get("first_linked_at")),
+            key=rec.get("dispensed_key"),
+            dispensed_at=_epoch(rec.get("last_dispensed_at")),
+            claim_token=rec.get("claim_token", 0),
+        )
+
+    def cooldown_left(self, cooldown_days: int, now: Optional[float] = None) -> int:
+        """Seconds until another key may be claimed (0 if none is held or the cooldown passed)."""
+        if self.key is None or self.dispensed_at is None:
+            return 0
+        now = time.time() if now is None else now
+        return max(0, int(self.dispensed_at + cooldown_days * 86400 - now))
+
+
+def _epoch(ts: Optional[str]) -> Optional[int]:
+    return None if ts is None else int(datetime.fromisoformat(ts).timestamp())
+
+
+def user_key(user_id) -> str:
+    return f"{USER_PREFIX}{user_id}"
+
+
+# ── Access ──
+def load_user(user_id, fresh: bool = False) -> Optional[UserRecord]:
+    """The user's record, migrating a legacy entry in place on first read."""
+    raw = (db.get_fresh if fresh else db.get)(user_key(user_id))
+    if raw is None:
+        return None
+    rec = UserRecord.decode(raw)
+    if isinstance(raw, dict):
+        db[user_key(user_id)] = rec.encode()
+    return rec
+
+
+def save_user(rec: UserRecord):
+    db[user_key(rec.discord_id)] = rec.encode()
+
+
+def _migrate_batch(keys) -> int:
+    # re-read each record: a claim may have rewritten it since it was listed
+    pending = {}
+    for key in keys:
+        raw = db.get_fresh(key)
+        if isinstance(raw, dict):
+            pending[key] = UserRecord.from_legacy(raw).encode()
+    if pending:
+        db.set_many(pending)
+    return len(pending)
+
+
+def migration_steps(batch: int = MIGRATION_BATCH):
+    """Convert legacy user records `batch` at a time, yielding how many each step changed."""
+    # list keys only: each batch reads its values fresh anyway
+    keys = list(db.scan(USER_PREFIX))
+    for i in range(0, len(keys), batch):
+        yield _migrate_batch(keys[i:i + batch])
+
+
+def migrate_users(batch: int = MIGRATION_BATCH) -> int:
+    """Rewrite every legacy user record in the compact form; returns how many changed."""
+    return sum(migration_steps(batch))
+
+
+async def run_migration(pause: float = 0.05):
+    """One-shot background migration in small steps (skipped once the flag is set).
+
+    The listing and every batch run in a worker thread: on Replit DB each
+    read is a network round-trip.
+    """
+    if db.get(MIGRATION_FLAG):
+        return
+    steps, converted = migration_steps(), 0
+    while (n := await asyncio.to_thread(next, steps, None)) is not None:
+        converted += n
+        await asyncio.sleep(pause)
+    db[MIGRATION_FLAG] = RECORD_VERSION
+    if converted:
+        print(f"[🔧] Migrated {converted} user records to v{RECORD_VERSION}")
@@ -0,0 +1,268 @@
+# reminders.py
+import os
+import time
+import heapq
+import asyncio
+from typing import Optional
+import discord
+from storage import db
+from records import UserRecord, load_user, USER_PREFIX
+from metrics import REMINDERS
+
+# ── Config ──
+REMINDER_RATE  = float(os.environ.get("REMINDER_RATE", 5))  # reminder DMs per second
+REMINDER_BATCH = 50     # due users popped per pass
+LOOKAHEAD      = 3600   # seconds of upcoming expiries held in memory
+LOAD_HOURS     = 24     # hour buckets loaded per pass when catching up
+BACKFILL_BATCH = 500
+
+# ── Cooldown index ──
+# A marker `cooldownidx:{hour}:{user_id}` -> {"at", "notify"} files every
+# held key under the hour it was dispensed in. Filing by dispense time
+# rather than expiry means /set_cooldown_days moves every expiry at once
+# without rewriting a single marker. `done_hour` is the last hour whose
+# markers have all expired and been handled.
+INDEX_FMT = "cooldownidx:{}:"
+DONE_KEY  = "cooldownidx:done_hour"
+
+
+def _hour(ts: float) -> int:
+    return int(ts // 3600)
+
+
+def marker(user_id, dispensed_at: float) -> str:
+    return INDEX_FMT.format(_hour(dispensed_at)) + str(user_id)
+
+
+def index_entry(dispensed_at: int, notify: bool = False) -> dict:
+    return {"at": dispensed_at, "notify": notify}
+
+
+def backfill(cutoff: float, batch: int = BACKFILL_BATCH) -> int:
+    """One-off: file every key still in cooldown (dispensed after `cutoff`) in the index."""
+    pending, filed = {}, 0
+    for _, raw in db.items(USER_PREFIX):
+        user = UserRecord.decode(raw)
+        if user.key is None or user.dispensed_at is None or user.dispensed_at < cutoff:
+            continue
+        pending[marker(user.discord_id, user.dispensed_at)] = index_entry(user.dispensed_at)
+        if len(pending) >= batch:
+            db.set_many(pending)
+            filed += len(pending)
+            pending = {}
+    if pending:
+        db.set_many(pending)
+        filed += len(pending)
+    return filed
+
+
+def _read_hours(first: int, last: int) -> list:
+    """(dispensed_at, user_id) for every marker filed in hours `first`..`last`."""
+    entries = []
+    for hour in range(first, last + 1):
+        prefix = INDEX_FMT.format(hour)
+        entries += [(entry["at"], key[len(prefix):]) for key, entry in db.items(prefix)]
+    return entries
+
+
+def _claim(due: list) -> list:
+    """Pop the markers of `due`; returns the (user_id, entry) pairs to DM.
+
+    Whoever pops a marker owns it, so replicas never remind a user twice.
+    """
+    owned = []
+    for at, user_id in due:
+        entry = db.pop(marker(user_id, at))
+        if entry is None:
+            continue  # unlinked, or handled by another replica
+        if entry["at"] != at:
+            # re-claimed within the same hour: the marker belongs to the new key
+            db[marker(user_id, at)] = entry
+            continue
+        if not entry["notify"]:
+            REMINDERS.labels("expired").inc()
+            continue
+        owned.append((user_id, entry))
+    return owned
+
+
+# ── Expiry scheduler ──
+# Only the next LOOKAHEAD of expiries lives in memory: a min-heap of
+# (dispensed_at, user_id) is topped up one hour bucket at a time, so
+# startup and steady state never walk every user record. Due markers are
+# popped (whoever pops one owns it, across replicas) and users who opted
+# in get a DM from a sender paced at REMINDER_RATE.
+class Reminders:
+    def __init__(self, rate: float = REMINDER_RATE, batch: int = REMINDER_BATCH):
+        self.rate         = rate
+        self.batch        = batch
+        self.client       = None
+        self.default_days = 30
+        self._heap        = []    # (dispensed_at, user_id) for loaded hours
+        self._loaded      = None  # newest hour bucket loaded into the heap
+        self._loading     = None  # newest hour bucket being read in
+        self._loop        = None
+        self._wake        = None
+        self._task        = None
+        self._next_send   = 0.0   # monotonic time the sender may next DM
+
+    def start(self, client: discord.Client, default_days: int):
+        """Start the scheduler on the running loop (idempotent)."""
+        if self._task is not None and not self._task.done():
+            return
+        self.client       = client
+        self.default_days = default_days
+        self._wake        = asyncio.Event()
+        self._loop        = asyncio.get_running_loop()
+        self._task        = self._loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def cooldown_days(self) -> int:
+        return db.get("config:cooldown_days", self.default_days)
+
+    # ── Index updates ──
+    def track(self, user_id, dispensed_at: int, previous: Optional[int] = None):
+        """A key was dispensed: drop the user's old marker and load the new one if it is near.
+
+        Called from the claim's worker thread; the heap is only touched on the loop.
+        """
+        if previous is not None and _hour(previous) != _hour(dispensed_at):
+            db.delete(marker(user_id, previous))
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._push, dispensed_at, str(user_id))
+
+    def _push(self, dispensed_at: int, user_id: str):
+        # an hour still being read in may have missed this marker, so it counts as loaded
+        loaded = self._loaded if self._loading is None else self._loading
+        if loaded is not None and _hour(dispensed_at) <= loaded:
+            heapq.heappush(self._heap, (dispensed_at, user_id))
+            self.reschedule()
+
+    def forget(self, user: UserRecord):
+        """The user was unlinked; a stale heap entry is skipped once its marker is gone."""
+        if user.dispensed_at is not None:
+            db.delete(marker(user.discord_id, user.dispensed_at))
+
+    def opt_in(self, user: UserRecord) -> bool:
+        """DM `user` when their cooldown ends; False if they hold no key."""
+        if user.key is None or user.dispensed_at is None:
+            return False
+        db[marker(user.discord_id, user.dispensed_at)] = index_entry(user.dispensed_at, notify=True)
+        return True
+
+    def reschedule(self):
+        """Re-evaluate what is due now (after a dispense or a cooldown change)."""
+        if self._wake is not None:
+            self._wake.set()
+
+    def upcoming(self) -> int:
+        """Cooldowns ending within the lookahead window (read by /status)."""
+        return len(self._heap)
+
+    # ── Scheduling ──
+    async def _run(self):
+        done = await asyncio.to_thread(db.get, DONE_KEY)
+        if done is None:
+            cutoff = time.time() - self.cooldown_days() * 86400
+            filed  = await asyncio.to_thread(backfill, cutoff)
+            done   = _hour(cutoff) - 1
+            await asyncio.to_thread(db.set, DONE_KEY, done)
+            if filed:
+                print(f"[⏰] Indexed {filed} active cooldowns")
+        self._loaded = done
+        while True:
+            self._wake.clear()
+            try:
+                cutoff = time.time() - self.cooldown_days() * 86400
+                if await self._load(_hour(cutoff + LOOKAHEAD)):
+                    continue  # catching up after downtime, LOAD_HOURS at a time
+                due = []
+                while self._heap and self._heap[0][0] <= cutoff and len(due) < self.batch:
+                    due.append(heapq.heappop(self._heap))
+                if due:
+                    await self._send_batch(due)
+                    continue
+                await asyncio.to_thread(self._advance, self._done_hour())
+                timeout = min(LOOKAHEAD, self._heap[0][0] - cutoff) if self._heap else LOOKAHEAD
+            except Exception as e:
+                print(f"[REMINDER ERROR] {e!r}")
+                timeout = LOOKAHEAD / 60
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _load(self, through: int) -> bool:
+        """Push the markers of the next hour buckets up to `through`; True if more remain."""
+        stop = min(through, self._loaded + LOAD_HOURS)
+        if stop > self._loaded:
+            self._loading = stop
+            try:
+                entries = await asyncio.to_thread(_read_hours, self._loaded + 1, stop)
+            finally:
+                self._loading = None
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+            self._loaded = stop
+        return stop < through
+
+    def _done_hour(self) -> int:
+        return _hour(self._heap[0][0]) - 1 if self._heap else self._loaded
+
+    @staticmethod
+    def _advance(done: int):
+        if done > db.get(DONE_KEY, -1):
+            db[DONE_KEY] = done
+
+    # ── Batch sender ──
+    async def _send_batch(self, due: list):
+        sends = []
+        for user_id, entry in await asyncio.to_thread(_claim, due):
+            wait = self._next_send - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_send = max(self._next_send, time.monotonic()) + 1 / self.rate
+            sends.append(asyncio.create_task(self._notify(user_id, entry)))
+        await asyncio.gather(*sends)
+
+    async def _notify(self, user_id: str, entry: dict):
+        user = await asyncio.to_thread(load_user, user_id)
+        if user is None or user.dispensed_at != entry["at"]:
+            return
+        try:
+            channel = await self.client.create_dm(discord.Object(id=int(user_id)))
+            await channel.send(embed=discord.Embed(
+                title="⏰ Your Next Trial Is Ready",
+                description="Your cooldown has ended—run `/trial` in the server to claim another SkySpoofer trial key.",
+                color=discord.Color.green()
+            ))
+        except discord.Forbidden:
+            REMINDERS.labels("blocked").inc()
+        except discord.RateLimited as e:
+            await self._requeue(user_id, entry, e.retry_after)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                await self._requeue(user_id, entry, float(e.response.headers.get("Retry-After", 5)))
+            else:
+                REMINDERS.labels("failed").inc()
+                print(f"[REMINDER ERROR] DM to {user_id} failed: {e}")
+        except Exception as e:
+            REMINDERS.labels("failed").inc()
+            print(f"[REMINDER ERROR] DM to {user_id} failed: {e!r}")
+        else:
+            REMINDERS.labels("sent").inc()
+
+    async def _requeue(self, user_id: str, entry: dict, retry_after: float):
+        """Rate limited: put the reminder back and hold the whole sender off."""
+        await asyncio.to_thread(db.set, marker(user_id, entry["at"]), entry)
+        heapq.heappush(self._heap, (entry["at"], user_id))
+        self._next_send = max(self._next_send, time.monotonic() + retry_after)
+        REMINDERS.labels("rate_limited").inc()
+
+
+reminders = Reminders()
@@ -0,0 +1,184 @@
+# snapshot.py
+"""Back up, restore and summarise the bot's database.
+
+Snapshots are gzip-compressed JSONL: a header line, one {"k", "v"} line
+per entry, and a footer with the entry count so truncated files are
+caught on restore. Every command streams page by page and never holds
+the whole dataset in memory.
+
+usage:
+  python snapshot.py export [-o FILE] [--prefix user: ...] [--page-size 500] [--concurrency 8]
+  python snapshot.py restore FILE [--backend sqlite] [--batch 500] [--force]
+  python snapshot.py stats [FILE]
+"""
+import sys
+import gzip
+import json
+import time
+import argparse
+from collections import Counter
+from datetime import datetime, timezone
+from storage import open_store, dumps, STORAGE_BACKEND
+
+SNAPSHOT_VERSION = 1
+PAGE_SIZE        = 500
+CONCURRENCY      = 8    # parallel value fetches per page (Replit DB round-trips)
+PROGRESS_EVERY   = 10_000
+
+
+def progress(count: int, added: int):
+    if count // PROGRESS_EVERY != (count - added) // PROGRESS_EVERY:
+        print(f"  … {count} entries", file=sys.stderr)
+
+
+def section(key: str) -> str:
+    head, sep, _ = key.partition(":")
+    return head + sep if sep else "flags"
+
+
+# ── Export ──
+def export(store, path: str, prefixes, page_size: int = PAGE_SIZE, concurrency: int = CONCURRENCY) -> int:
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8") as out, store.snapshot():
+        out.write(dumps({
+            "snapshot": SNAPSHOT_VERSION,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "prefixes": prefixes,
+        }) + "\n")
+        for prefix in prefixes:
+            for page in store.pages(prefix, page_size, concurrency):
+                out.writelines(dumps({"k": k, "v": v}) + "\n" for k, v in page)
+                count += len(page)
+                progress(count, len(page))
+        out.write(dumps({"end": count}) + "\n")
+    return count
+
+
+def read_snapshot(path: str):
+    """Yield (key, value) pairs from a snapshot file, checking header and footer."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("snapshot") != SNAPSHOT_VERSION:
+            raise ValueError(f"{path}: not a v{SNAPSHOT_VERSION} snapshot")
+        count = 0
+        for line in f:
+            row = json.loads(line)
+            if "end" in row:
+                if row["end"] != count:
+                    raise ValueError(f"{path}: footer says {row['end']} entries, read {count}")
+                return
+            count += 1
+            yield row["k"], row["v"]
+    raise ValueError(f"{path}: truncated after {count} entries (no footer)")
+
+
+# ── Restore ──
+def restore(store, path: str, batch: int = PAGE_SIZE) -> int:
+    count, pending = 0, {}
+    for key, value in read_snapshot(path):
+        pending[key] = value
+        if len(pending) >= batch:
+            store.set_many(pending)
+            count += len(pending)
+            progress(count, len(pending))
+            pending = {}
+    if pending:
+        store.set_many(pending)
+        count += len(pending)
+    return count
+
+
+# ── Stats ──
+def summarise(pairs) -> dict:
+    """Single pass over (key, value) pairs; memory stays bounded by the number of sections."""
+    sections = Counter()
+    sizes    = Counter()
+    users    = Counter()
+    markers  = Counter()  # pool generation -> key markers stamped with it
+    outbox   = Counter()
+    gen      = None
+    for key, value in pairs:
+        name = section(key)
+        sections[name] += 1
+        sizes[name]    += len(dumps(value))
+        if name == "user:":
+            users["linked"] += 1
+            legacy = isinstance(value, dict)
+            users["legacy"] += legacy
+            users["with_key"] += bool(value.get("dispensed_key") if legacy else value[4])
+        elif name == "key:":
+            markers[value] += 1
+        elif name == "outbox:":
+            outbox[value.get("state", "pending")] += 1
+        elif key == "pool:gen":
+            gen = value
+    return {
+        "sections": sections, "sizes": sizes, "users": users,
+        "available_keys": markers.get(gen, 0), "outbox": outbox,
+    }
+
+
+def print_stats(stats: dict):
+    print(f"{'section':<12} {'entries':>10} {'bytes':>12}")
+    for name, n in sorted(stats["sections"].items()):
+        print(f"{name:<12} {n:>10} {stats['sizes'][name]:>12}")
+    print(f"{'total':<12} {sum(stats['sections'].values()):>10} {sum(stats['sizes'].values()):>12}\n")
+    users = stats["users"]
+    print(f"👤 users: {users['linked']} linked · {users['with_key']} holding a key · "
+          f"{users['legacy']} in the legacy format")
+    print(f"🔑 keys available: {stats['available_keys']}")
+    if stats["outbox"]:
+        print("📨 outbox: " + " · ".join(f"{n} {s}" for s, n in sorted(stats["outbox"].items())))
+
+
+def live_pairs(store, page_size: int = PAGE_SIZE, concurrency: int = CONCURRENCY):
+    with store.snapshot():
+        for page in store.pages("", page_size, concurrency):
+            yield from page
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Back up, restore and summarise the bot database.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ex = sub.add_parser("export", help="stream the database to a compressed snapshot")
+    ex.add_argument("-o", "--output", default=f"snapshot-{datetime.now():%Y%m%d-%H%M%S}.jsonl.gz")
+    ex.add_argument("--prefix", action="append", help="only entries under this prefix (repeatable)")
+    ex.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    ex.add_argument("--concurrency", type=int, default=CONCURRENCY)
+
+    rs = sub.add_parser("restore", help="load a snapshot into a storage backend")
+    rs.add_argument("file")
+    rs.add_argument("--backend", default=STORAGE_BACKEND, choices=("replit", "sqlite", "memory"))
+    rs.add_argument("--batch", type=int, default=PAGE_SIZE)
+    rs.add_argument("--force", action="store_true", help="restore even if the target is not empty")
+
+    st = sub.add_parser("stats", help="summarise a snapshot file, or the live database")
+    st.add_argument("file", nargs="?")
+
+    args  = parser.parse_args(argv)
+    start = time.perf_counter()
+
+    if args.command == "export":
+        store = open_store(cached=False, timed=False)
+        count = export(store, args.output, args.prefix or [""], args.page_size, args.concurrency)
+        print(f"💾 Exported {count} entries to {args.output} in {time.perf_counter() - start:.1f}s")
+
+    elif args.command == "restore":
+        store = open_store(args.backend, cached=False, timed=False)
+        if not args.force and next(iter(store.scan()), None) is not None:
+            sys.exit(f"❌ The {args.backend} store is not empty; pass --force to merge into it.")
+        count = restore(store, args.file, args.batch)
+        print(f"♻️ Restored {count} entries into {args.backend} in {time.perf_counter() - start:.1f}s")
+
+    else:
+        if args.file:
+            stats = summarise(read_snapshot(args.file))
+        else:
+            stats = summarise(live_pairs(open_store(cached=False, timed=False)))
+        print_stats(stats)
+        print(f"\n⏱️ {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# states.py
+import time
+import asyncio
+import secrets
+from datetime import datetime, timezone
+from storage import db
+
+STATE_TTL_HOURS = 1
+SWEEP_INTERVAL  = 300  # seconds between sweeper runs
+
+# ── OAuth state TTL index ──
+# Each `state:{token}` carries its own `expires_at`, and a marker
+# `stateidx:{hour}:{token}` files it under the hour it expires in. The
+# sweeper drops whole expired hours with one prefix scan each, so nothing
+# ever has to walk every state.
+INDEX_FMT = "stateidx:{}:"
+SWEPT_KEY = "stateidx:swept_hour"
+
+
+def _hour(ts: float) -> int:
+    return int(ts // 3600)
+
+
+def create_state(user_id: str) -> str:
+    """Store a fresh OAuth state for `user_id` and return its token."""
+    token   = secrets.token_urlsafe(16)
+    now     = datetime.now(timezone.utc)
+    expires = now.timestamp() + STATE_TTL_HOURS * 3600
+    db.set_many({
+        f"state:{token}": {
+            "user_id": user_id,
+            "created_at": now.isoformat(),
+            "expires_at": expires
+        },
+        INDEX_FMT.format(_hour(expires)) + token: 1
+    })
+    return token
+
+
+def consume_state(token: str):
+    """Pop a state; returns its record, or None if unknown or expired."""
+    rec = db.pop(f"state:{token}", None)
+    if not isinstance(rec, dict) or rec.get("expires_at", 0) < time.time():
+        return None
+    return rec
+
+
+def sweep_expired() -> int:
+    """Drop every state in hour buckets that have fully expired."""
+    current = _hour(time.time())
+    swept   = db.get(SWEPT_KEY)
+    if swept is None:
+        purge_legacy_states()
+        swept = current - 1
+    removed = 0
+    for hour in range(swept + 1, current):
+        prefix = INDEX_FMT.format(hour)
+        index  = list(db.scan(prefix))
+        db.delete_many([f"state:{k[len(prefix):]}" for k in index] + index)
+        removed += len(index)
+    if current - 1 != swept:
+        db[SWEPT_KEY] = current - 1
+    return removed
+
+
+def purge_legacy_states() -> int:
+    """One-off cleanup of states written before the TTL index existed."""
+    now   = time.time()
+    stale = [
+        k for k, v in db.items("state:")
+        if not isinstance(v, dict) or v.get("expires_at", 0) < now
+    ]
+    db.delete_many(stale)
+    return len(stale)
+
+
+async def run_sweeper(interval: float = SWEEP_INTERVAL):
+    while True:
+        try:
+            removed = await asyncio.to_thread(sweep_expired)
+            if removed:
+                print(f"[🧹] Swept {removed} expired OAuth states")
+        except Exception as e:
+            print(f"[SWEEP ERROR] {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,384 @@
+# storage.py
+import os
+import abc
+import json
+import sqlite3
+import itertools
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+# ── Backend selection ──
+# STORAGE_BACKEND=replit (default) talks to the Replit KV service;
+# STORAGE_BACKEND=sqlite keeps everything in a local WAL-mode database file;
+# STORAGE_BACKEND=memory is a throwaway in-process dict (benchmarks, offline runs).
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "replit").lower()
+SQLITE_PATH     = os.environ.get("SQLITE_PATH", "bot.db")
+STORE_CACHE     = os.environ.get("STORE_CACHE", "1") != "0"
+STORE_METRICS   = os.environ.get("STORE_METRICS", "1") != "0"
+
+_MISSING = object()
+
+
+def dumps(value) -> str:
+    """JSON without the spaces json.dumps puts after separators."""
+    return json.dumps(value, separators=(",", ":"))
+
+
+class Store(abc.ABC):
+    """Key/value interface shared by every backend.
+
+    Subclasses implement get/set/delete/scan/pop (and may batch set_many);
+    the mapping dunders let callers keep using `db[key]`, `key in db` and friends.
+    """
+
+    @abc.abstractmethod
+    def get(self, key: str, default=None):
+        ...
+
+    def get_fresh(self, key: str, default=None):
+        """Like get(), but bypasses any cache in front of the backend."""
+        return self.get(key, default)
+
+    @abc.abstractmethod
+    def set(self, key: str, value) -> None:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> bool:
+        """Remove `key`; returns False if it did not exist."""
+
+    @abc.abstractmethod
+    def scan(self, prefix: str = ""):
+        """Yield every key starting with `prefix`."""
+
+    @abc.abstractmethod
+    def pop(self, key: str, default=None):
+        """Atomically remove `key` and return its value."""
+
+    def incr(self, key: str, delta: int = 1) -> int:
+        """Add `delta` to an integer entry (missing = 0); returns the new value."""
+        value = self.get(key, 0) + delta
+        self.set(key, value)
+        return value
+
+    def set_many(self, items: dict) -> None:
+        """Write several entries in one batch."""
+        for key, value in items.items():
+            self.set(key, value)
+
+    def delete_many(self, keys) -> None:
+        for key in keys:
+            self.delete(key)
+
+    def items(self, prefix: str = ""):
+        for key in self.scan(prefix):
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                yield key, value
+
+    def pages(self, prefix: str = "", size: int = 500, concurrency: int = 1):
+        """Yield lists of up to `size` (key, value) pairs under `prefix`.
+
+        Values of a page are fetched by up to `concurrency` threads, so a
+        full listing never holds more than one page in memory.
+        """
+        with ThreadPoolExecutor(concurrency) as pool:
+            keys = iter(self.scan(prefix))
+            while page := list(itertools.islice(keys, size)):
+                values = pool.map(lambda k: self.get(k, _MISSING), page)
+                yield [(k, v) for k, v in zip(page, values) if v is not _MISSING]
+
+    @contextlib.contextmanager
+    def snapshot(self):
+        """Reads inside see one point-in-time view where the backend supports it."""
+        yield self
+
+    def keys(self):
+        return list(self.scan())
+
+    def __getitem__(self, key: str):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value) -> None:
+        self.set(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        if not self.delete(key):
+            raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        return iter(self.scan())
+
+
+# ── Replit DB adapter ──
+class ReplitStore(Store):
+    def __init__(self):
+        from replit import db as replit_db
+        self._db   = replit_db
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        # raw JSON gives plain dicts/lists rather than auto-saving observed ones
+        try:
+            return json.loads(self._db.get_raw(key))
+        except KeyError:
+            return default
+
+    def set(self, key, value):
+        self._db[key] = value
+
+    def delete(self, key):
+        try:
+            del self._db[key]
+            return True
+        except KeyError:
+            return False
+
+    def scan(self, prefix=""):
+        return iter(self._db.prefix(prefix))
+
+    def pop(self, key, default=None):
+        # the KV service has no atomic pop; serialise within this process
+        with self._lock:
+            try:
+                value = json.loads(self._db.get_raw(key))
+            except KeyError:
+                return default
+            self.delete(key)
+            return value
+
+    def incr(self, key, delta=1):
+        # atomic within this process only; the KV service has no counters
+        with self._lock:
+            return super().incr(key, delta)
+
+    def set_many(self, items):
+        if hasattr(self._db, "set_bulk"):
+            self._db.set_bulk(items)
+        else:
+            super().set_many(items)
+
+
+# ── SQLite backend ──
+# Keys, users and OAuth states get their own tables keyed by the part after
+# the prefix; everything else (config, pool index, flags) lives in `kv`.
+_TABLES = {"key:": "keys", "user:": "users", "state:": "states"}
+
+
+def _sql(table: str) -> dict:
+    return {
+        "get":    f"SELECT value FROM {table} WHERE id = ?",
+        "set":    f"INSERT INTO {table} (id, value) VALUES (?, ?) "
+                  f"ON CONFLICT(id) DO UPDATE SET value = excluded.value",
+        "delete": f"DELETE FROM {table} WHERE id = ?",
+        "incr":   f"INSERT INTO {table} (id, value) VALUES (?, ?) "
+                  f"ON CONFLICT(id) DO UPDATE SET value = CAST(value AS INTEGER) + excluded.value "
+                  f"RETURNING value",
+        "all":    f"SELECT id FROM {table} ORDER BY id",
+        "range":  f"SELECT id FROM {table} WHERE id >= ? AND id < ? ORDER BY id",
+        "all_items":   f"SELECT id, value FROM {table} ORDER BY id",
+        "range_items": f"SELECT id, value FROM {table} WHERE id >= ? AND id < ? ORDER BY id",
+    }
+
+
+class SQLiteStore(Store):
+    def __init__(self, path: str = SQLITE_PATH):
+        self._conn = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False, cached_statements=64
+        )
+        self._lock = threading.RLock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        for table in (*_TABLES.values(), "kv"):
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (id TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+        self._sql = {table: _sql(table) for table in (*_TABLES.values(), "kv")}
+
+    def _route(self, key: str):
+        for prefix, table in _TABLES.items():
+            if key.startswith(prefix):
+                return table, key[len(prefix):]
+        return "kv", key
+
+    def get(self, key, default=None):
+        table, ident = self._route(key)
+        with self._lock:
+            row = self._conn.execute(self._sql[table]["get"], (ident,)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key, value):
+        table, ident = self._route(key)
+        with self._lock:
+            self._conn.execute(self._sql[table]["set"], (ident, dumps(value)))
+
+    def delete(self, key):
+        table, ident = self._route(key)
+        with self._lock:
+            cur = self._conn.execute(self._sql[table]["delete"], (ident,))
+        return cur.rowcount > 0
+
+    def incr(self, key, delta=1):
+        table, ident = self._route(key)
+        with self._lock:
+            row = self._conn.execute(self._sql[table]["incr"], (ident, delta)).fetchone()
+        return int(row[0])
+
+    def _targets(self, prefix: str):
+        table, ident = self._route(prefix)
+        if table != "kv":
+            return [(prefix[: len(prefix) - len(ident)], table, ident)]
+        # a short prefix like "" or "us" may also cover whole tables
+        targets = [(p, t, "") for p, t in _TABLES.items() if p.startswith(prefix)]
+        targets.append(("", "kv", prefix))
+        return targets
+
+    def _select(self, prefix: str, kind: str):
+        rows = []
+        with self._lock:
+            for key_prefix, t, start in self._targets(prefix):
+                if start:
+                    # half-open range keeps the primary-key index in play
+                    upper = start[:-1] + chr(ord(start[-1]) + 1)
+                    cur = self._conn.execute(self._sql[t][f"range{kind}"], (start, upper))
+                else:
+                    cur = self._conn.execute(self._sql[t][f"all{kind}"])
+                rows.extend((key_prefix, r) for r in cur)
+        return rows
+
+    def scan(self, prefix=""):
+        return iter([p + r[0] for p, r in self._select(prefix, "")])
+
+    def items(self, prefix=""):
+        # one query for keys and values instead of a get() per key
+        return iter([(p + r[0], json.loads(r[1])) for p, r in self._select(prefix, "_items")])
+
+    def pages(self, prefix="", size=500, concurrency=1):
+        # keyset pagination: every page is one range query on the primary key
+        for key_prefix, table, start in self._targets(prefix):
+            upper = start[:-1] + chr(ord(start[-1]) + 1) if start else None
+            op, cursor = ">=", start
+            while True:
+                with self._lock:
+                    rows = self._conn.execute(
+                        f"SELECT id, value FROM {table} WHERE id {op} ? "
+                        f"AND (? IS NULL OR id < ?) ORDER BY id LIMIT ?",
+                        (cursor, upper, upper, size)
+                    ).fetchall()
+                if rows:
+                    yield [(key_prefix + i, json.loads(v)) for i, v in rows]
+                if len(rows) < size:
+                    break
+                op, cursor = ">", rows[-1][0]
+
+    @contextlib.contextmanager
+    def snapshot(self):
+        # one deferred read transaction: WAL keeps its view stable while
+        # other processes keep writing
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                yield self
+            finally:
+                self._conn.execute("COMMIT")
+
+    def pop(self, key, default=None):
+        table, ident = self._route(key)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(self._sql[table]["get"], (ident,)).fetchone()
+                if row is not None:
+                    self._conn.execute(self._sql[table]["delete"], (ident,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return default if row is None else json.loads(row[0])
+
+    def set_many(self, items):
+        grouped = {}
+        for key, value in items.items():
+            table, ident = self._route(key)
+            grouped.setdefault(table, []).append((ident, dumps(value)))
+        self._write_batch(grouped, "set")
+
+    def delete_many(self, keys):
+        grouped = {}
+        for key in keys:
+            table, ident = self._route(key)
+            grouped.setdefault(table, []).append((ident,))
+        self._write_batch(grouped, "delete")
+
+    def _write_batch(self, grouped: dict, op: str):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for table, rows in grouped.items():
+                    self._conn.executemany(self._sql[table][op], rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+# ── In-memory backend ──
+# Values are stored as JSON text so callers get fresh copies, like the
+# real backends.
+class MemoryStore(Store):
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        raw = self._data.get(key)
+        return default if raw is None else json.loads(raw)
+
+    def set(self, key, value):
+        self._data[key] = dumps(value)
+
+    def delete(self, key):
+        return self._data.pop(key, None) is not None
+
+    def scan(self, prefix=""):
+        return iter(sorted(k for k in list(self._data) if k.startswith(prefix)))
+
+    def pop(self, key, default=None):
+        with self._lock:
+            raw = self._data.pop(key, None)
+        return default if raw is None else json.loads(raw)
+
+    def incr(self, key, delta=1):
+        with self._lock:
+            return super().incr(key, delta)
+
+
+def open_store(
+    backend: str = STORAGE_BACKEND, cached: bool = STORE_CACHE, timed: bool = STORE_METRICS
+) -> Store:
+    if backend == "sqlite":
+        store = SQLiteStore()
+    elif backend == "replit":
+        store = ReplitStore()
+    elif backend == "memory":
+        store = MemoryStore()
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend!r}")
+    if timed:
+        from metrics import InstrumentedStore
+        store = InstrumentedStore(store)
+    if cached:
+        from cache import CachedStore
+        store = CachedStore(store)
+    return store
+
+
+db = open_store()